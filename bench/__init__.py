@@ -0,0 +1,3 @@
+from .aged import age, generate
+from .run import run
+from .suite import cases, compare, load, measure, save, table
@@ -0,0 +1,109 @@
+import json, os
+from argparse import ArgumentParser
+
+from . import micro
+from .aged import PROFILES, generate, remove
+from .run import run
+from .suite import BACKENDS, BASELINE, FILE_SYSTEMS, LADDER, cases, compare, load, measure, save, table
+
+
+MICRO_BASELINE = os.path.join(os.path.dirname(__file__), 'micro.json')
+
+MICRO_SIZES = [1 << 30, 32 << 30]
+
+
+def size(text: str) -> int:
+    '''16M, 4G, 2T or plain bytes'''
+
+    factors = {'K': 10, 'M': 20, 'G': 30, 'T': 40}
+
+    if text[-1].upper() in factors:
+        return int(text[:-1]) << factors[text[-1].upper()]
+
+    return int(text)
+
+
+def main():
+    parser = ArgumentParser(prog='python -m bench', description='AlterFAT format benchmark')
+    parser.add_argument('--sizes', nargs='+', type=size)
+    parser.add_argument('--fs', nargs='+', default=list(FILE_SYSTEMS), choices=FILE_SYSTEMS)
+    parser.add_argument('--backend', nargs='+', default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument('--dir', help='directory for sparse images')
+    parser.add_argument('--verify', action='store_true', help='format with read-back verification')
+    parser.add_argument('--baseline')
+    parser.add_argument('--save', action='store_true', help='store results as new baseline')
+    parser.add_argument('--one', nargs=3, metavar=('FS', 'SIZE', 'BACKEND'), help=None)
+    parser.add_argument('--micro', action='store_true', help='exfs micro-benchmarks on aged FAT32/exFAT images')
+    parser.add_argument('--profile', default='mixed', choices=PROFILES, help='aging profile for --micro')
+    parser.add_argument('--seconds', type=float, default=1.0, help='time per micro-benchmark')
+    parser.add_argument('--keep', action='store_true', help='keep aged images and manifests')
+    args = parser.parse_args()
+
+    if args.micro:
+        return aged(args)
+
+    if args.one:
+        fs, one, backend = args.one
+        print(json.dumps(run(fs, int(one), backend, args.dir, args.verify)))
+        return 0
+
+    results = []
+
+    for fs, one, backend in cases(args.sizes or LADDER, args.fs, args.backend):
+        results.append(measure(fs, one, backend, args.dir, args.verify))
+        print(table(results[-1:]).splitlines()[-1], flush=True)
+
+    print()
+    print(table(results))
+
+    regressions = compare(results, load(args.baseline or BASELINE))
+
+    if args.save:
+        save(results, args.baseline or BASELINE)
+
+    if regressions:
+        print()
+        print('Regressions:')
+        print('\n'.join(regressions))
+        return 1
+
+    return 0
+
+
+def aged(args) -> int:
+    '''age images, run micro-benchmarks on them and compare with baseline'''
+
+    results = []
+
+    for one in args.sizes or MICRO_SIZES:
+        for fs in args.fs:
+            if fs not in ('FAT32', 'exFAT'):
+                continue
+            path, manifest = generate(fs, one, directory=args.dir, **PROFILES[args.profile])
+            try:
+                done = micro.run(path, manifest, args.seconds)
+            finally:
+                if not args.keep:
+                    remove(path)
+            results += done
+            print(micro.table(done).split('\n', 1)[1], flush=True)
+
+    print()
+    print(micro.table(results))
+
+    regressions = micro.compare(results, load(args.baseline or MICRO_BASELINE))
+
+    if args.save:
+        micro.save(results, args.baseline or MICRO_BASELINE)
+
+    if regressions:
+        print()
+        print('Regressions:')
+        print('\n'.join(regressions))
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
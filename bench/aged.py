@@ -0,0 +1,164 @@
+import json, os, random
+from collections import OrderedDict
+from math import exp, log
+from struct import pack
+from typing import List, Tuple
+
+from mkfs import fat, fopen
+from mkfs.dostime import GetDosDateTime
+from mkfs.exfs import FAT, Chain, exFATDirentry
+from mkfs.reader import volume
+from mkfs.usage import store
+from .run import image
+
+
+# mixed: файлы от 1 до 64 МБ, записанные по 4 одновременно, треть удалена и записана заново
+# dashcam: видеорегистратор, клипы по 30-200 МБ, половина перезаписана по кругу
+PROFILES = {'mixed': {'files': 1000, 'sizes': (1 << 20, 64 << 20), 'streams': 4, 'piece': 1 << 20, 'churn': 0.3, 'fill': 0.8},
+            'dashcam': {'files': 400, 'sizes': (30 << 20, 200 << 20), 'streams': 4, 'piece': 1 << 20, 'churn': 0.5, 'fill': 0.9}}
+
+
+def dirent(fs: str, number: int, lenght: int, runs: OrderedDict) -> bytes:
+    '''directory entry of generated file'''
+
+    start = next(iter(runs))
+    stamp = GetDosDateTime()
+
+    if fs != 'exFAT':
+        return pack('<11sBBBHHHHHHHI', b'%08dMP4' % number, 0x20, 0, 0, stamp & 0xFFFF, stamp >> 16, stamp >> 16,
+                    start >> 16, stamp & 0xFFFF, stamp >> 16, start & 0xFFFF, lenght)
+
+    b = bytearray(64)
+    b[0] = 0x85
+    b[32] = 0xC0
+    entry = exFATDirentry(b, 0)
+    entry.GenRawSlotFromName('%08d.MP4' % number)
+    entry.dwStartCluster = start
+    entry.u64DataLength = entry.u64ValidDataLength = lenght
+
+    if len(runs) == 1:
+        entry.IsContig(1)
+
+    return bytes(entry.pack())
+
+
+def write(allocator, queue: List[dict], streams: int, piece: int, rng: random.Random):
+    '''allocate queued files, streams of them interleaved piece clusters at a time'''
+
+    queue = list(queue)
+    active = []
+
+    while queue or active:
+        while queue and len(active) < streams:
+            active.append(queue.pop(0))
+        item = rng.choice(active)
+        count = min(piece, item['clusters'] - item['done'])
+        allocator.alloc(item['runs'], count)
+        item['done'] += count
+        if item['done'] == item['clusters']:
+            active.remove(item)
+
+
+def register(boot, table: FAT, fs: str, items: List[dict]):
+    '''append entries of generated files to root directory'''
+
+    root = Chain(boot, table, boot.dwRootCluster)
+    root.isdirectory = True
+
+    slots = root.read()
+    end = next((i for i in range(0, len(slots), 32) if not slots[i]), len(slots))
+
+    root.seek(end)
+    root.write(b''.join(dirent(fs, item['number'], item['size'], item['runs']) for item in items))
+
+    if fs == 'exFAT':
+        # корневой каталог exFAT всегда описан цепочкой FAT, даже непрерывный
+        runs = list(root.runs.items())
+        for start, count in runs:
+            table.mark_run(start, count)
+        for (start, count), (following, _) in zip(runs, runs[1:]):
+            table[start + count - 1] = following
+
+
+def age(stream, fs: str, files: int=1000, sizes: Tuple[int, int]=(1 << 20, 64 << 20), streams: int=4,
+        piece: int=1 << 20, churn: float=0.3, fill: float=0.8, seed: int=0) -> dict:
+    '''fragment formatted FAT32 or exFAT volume, return manifest of generated files'''
+
+    if fs not in ('FAT32', 'exFAT'):
+        raise ValueError(f'{fs}: only FAT32 and exFAT have growable root directory')
+
+    rng = random.Random(seed)
+    boot, table = volume(stream)
+    allocator = boot.bitmap if fs == 'exFAT' else table
+
+    lenghts = [int(exp(rng.uniform(log(sizes[0]), log(sizes[1])))) for i in range(files)]
+    scale = min(1.0, fill * allocator.free_clusters * boot.cluster / max(sum(lenghts), 1))
+    lenghts = [max(1, int(lenght * scale)) for lenght in lenghts]
+
+    def planned(number: int, lenght: int) -> dict:
+        return {'number': number, 'size': lenght, 'clusters': (lenght + boot.cluster - 1) // boot.cluster,
+                'done': 0, 'runs': OrderedDict()}
+
+    items = [planned(number, lenght) for number, lenght in enumerate(lenghts, 1)]
+    piece = max(1, piece // boot.cluster)
+
+    write(allocator, items, streams, piece, rng)
+
+    deleted = rng.sample(items, int(files * churn))
+
+    for old in deleted:
+        allocator.free(next(iter(old['runs'])), old['runs'])
+        items.remove(old)
+
+    rng.shuffle(deleted)
+    renewed = [planned(number, old['size']) for number, old in enumerate(deleted, files + 1)]
+
+    write(allocator, renewed, streams, piece, rng)
+
+    items += renewed
+    register(boot, table, fs, items)
+
+    store(boot, allocator.free_clusters, table.last_free_alloc + 1)
+
+    stream.flush()
+
+    fragments = [len(item['runs']) for item in items]
+
+    return {'fs': fs,
+            'cluster': boot.cluster,
+            'seed': seed,
+            'free_clusters': allocator.free_clusters,
+            'free_runs': len(allocator.free_clusters_map),
+            'fragments': sum(fragments),
+            'fragmented': sum(1 for count in fragments if count > 1),
+            'files': [{'name': '%08d.MP4' % item['number'], 'size': item['size'], 'runs': list(item['runs'].items())}
+                      for item in items]}
+
+
+def generate(fs: str, size: int, path: str=None, directory: str=None, **params) -> (str, dict):
+    '''format sparse image and age it, manifest saved next to image'''
+
+    if path is None:
+        path = image(size, directory)
+    else:
+        with open(path, 'wb') as f:
+            f.truncate(size)
+
+    with fopen(path, 'r+b') as stream:
+        fat(stream, fs, size, 0, 'AGED')
+        manifest = age(stream, fs, **params)
+
+    manifest['size'] = size
+
+    with open(path + '.json', 'w') as f:
+        json.dump(manifest, f)
+
+    return path, manifest
+
+
+def remove(path: str):
+    '''delete image and its manifest'''
+
+    for name in (path, path + '.json'):
+        if os.path.exists(name):
+            os.remove(name)
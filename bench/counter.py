@@ -0,0 +1,40 @@
+class counter(object):
+    # обертка над потоком, считающая вызовы ввода-вывода и записанные байты
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.mode = getattr(stream, 'mode', 'r+b')
+        self.calls = 0
+        self.written = 0
+        self.read_bytes = 0
+
+    def seek(self, position, stop=0):
+        self.calls += 1
+        return self.stream.seek(position, stop)
+
+    def read(self, lenghts=None):
+        self.calls += 1
+        byteOut = self.stream.read(lenghts)
+        self.read_bytes += len(byteOut)
+        return byteOut
+
+    def write(self, byteObj):
+        self.calls += 1
+        self.written += len(byteObj)
+        return self.stream.write(byteObj)
+
+    def flush(self):
+        self.calls += 1
+        self.stream.flush()
+
+    def tell(self):
+        return self.stream.tell()
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
@@ -0,0 +1,156 @@
+import json, random, tracemalloc
+from collections import OrderedDict
+from time import perf_counter
+from typing import Callable, Dict, List
+
+from mkfs import fopen
+from mkfs.exfs import Chain
+from mkfs.reader import volume
+from .suite import load
+
+
+# допустимое падение ops/s и рост пиковой памяти относительно сохраненного результата
+TOLERANCE = {'ops_s': 0.25, 'peak': 0.25}
+
+NOISE = {'ops_s': 0.0, 'peak': 1 << 20}
+
+
+def timed(function: Callable, seconds: float=1.0) -> dict:
+    '''call function for about seconds, then once more under tracemalloc'''
+
+    count = 0
+    start = perf_counter()
+
+    while True:
+        function()
+        count += 1
+        elapsed = perf_counter() - start
+        if elapsed >= seconds:
+            break
+
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'ops': count, 'seconds': elapsed, 'ops_s': count / elapsed, 'peak': peak}
+
+
+def split(runs: dict) -> dict:
+    '''free space map as left by many small frees'''
+
+    out = {}
+
+    for start, count in runs.items():
+        half = count // 2
+        if half:
+            out[start] = half
+        out[start + half] = count - half
+
+    return out
+
+
+def cases(stream, manifest: dict, chunk: int=1 << 16, seed: int=0) -> Dict[str, Callable]:
+    '''named operations over aged volume'''
+
+    fs = manifest['fs']
+    rng = random.Random(seed)
+    boot, table = volume(stream)
+    allocator = boot.bitmap if fs == 'exFAT' else table
+    name = type(allocator).__name__
+
+    files = sorted(manifest['files'], key=lambda f: len(f['runs']))
+    target = files[-1]
+    runs = target['runs']
+    chain = Chain(boot, table, runs[0][0], target['size'], nofat=fs == 'exFAT' and len(runs) == 1)
+    window = max(target['size'] - chunk, 1)
+    median = files[len(files) // 2]['size'] // manifest['cluster'] + 1
+    fragmented = split(allocator.free_clusters_map)
+
+    def map_free_space():
+        allocator.map_free_space()
+
+    def map_compact():
+        allocator.free_clusters_map = dict(fragmented)
+        allocator.free_clusters_flag = 1
+        allocator.map_compact()
+
+    def alloc():
+        chain_runs = OrderedDict()
+        allocator.alloc(chain_runs, median)
+        allocator.free(next(iter(chain_runs)), chain_runs)
+
+    def seek():
+        chain.seek(rng.randrange(window))
+
+    def read():
+        chain.seek(rng.randrange(window))
+        chain.read(chunk)
+
+    def write():
+        chain.seek(rng.randrange(window))
+        chain.write(bytes(chunk))
+
+    return OrderedDict([(f'{name}.map_free_space', map_free_space),
+                        (f'{name}.map_compact', map_compact),
+                        (f'{name}.alloc', alloc),
+                        ('Chain.seek', seek),
+                        ('Chain.read', read),
+                        ('Chain.write', write)])
+
+
+def run(path: str, manifest: dict, seconds: float=1.0, only: List[str]=None) -> List[dict]:
+    '''time every operation on aged image'''
+
+    results = []
+
+    with fopen(path, 'r+b') as stream:
+        for name, function in cases(stream, manifest).items():
+            if only and name not in only:
+                continue
+            result = timed(function, seconds)
+            result.update({'fs': manifest['fs'], 'size': manifest['size'], 'bench': name,
+                           'fragments': manifest['fragments'], 'free_runs': manifest['free_runs']})
+            results.append(result)
+
+    return results
+
+
+def key(result: dict) -> str:
+    return f"{result['fs']}/{result['size']}/{result['bench']}"
+
+
+def compare(results: List[dict], baseline: Dict[str, dict]) -> List[str]:
+    '''list of regressions against baseline, ops/s must not drop, peak memory must not grow'''
+
+    regressions = []
+
+    for result in results:
+        base = baseline.get(key(result))
+        if not base:
+            continue
+        if result['ops_s'] < base['ops_s'] * (1 - TOLERANCE['ops_s']) - NOISE['ops_s']:
+            regressions.append(f"{key(result)} ops/s: {base['ops_s']:.1f} -> {result['ops_s']:.1f}")
+        if result['peak'] > base['peak'] * (1 + TOLERANCE['peak']) + NOISE['peak']:
+            regressions.append(f"{key(result)} peak: {base['peak']} -> {result['peak']}")
+
+    return regressions
+
+
+def save(results: List[dict], path: str):
+    baseline = load(path)
+    baseline.update({key(result): result for result in results})
+
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=1, sort_keys=True)
+
+
+def table(results: List[dict]) -> str:
+    '''results as text table'''
+
+    lines = [f"{'fs':<6} {'size':>14} {'bench':<26} {'ops':>8} {'ops/s':>10} {'peak KB':>9}"]
+
+    for r in results:
+        lines.append(f"{r['fs']:<6} {r['size']:>14} {r['bench']:<26} {r['ops']:>8} {r['ops_s']:>10.1f} {r['peak'] / 1024:>9.1f}")
+
+    return '\n'.join(lines)
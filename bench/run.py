@@ -0,0 +1,59 @@
+import io, os
+from tempfile import mkstemp
+from time import perf_counter, process_time
+
+from mbr import mbr
+from mkfs import fat, fopen
+from .counter import counter
+from .rss import peak_rss
+
+
+def image(size: int, directory: str=None) -> str:
+    '''create sparse image file'''
+
+    handle, path = mkstemp(suffix='.img', dir=directory)
+    os.close(handle)
+
+    with open(path, 'r+b') as f:
+        f.truncate(size)
+
+    return path
+
+
+def run(fs: str, size: int, backend: str='image', directory: str=None, verify: bool=False) -> dict:
+    '''format one volume and measure it, bytesio-scan formats io.BytesIO with surface scan'''
+
+    bs = 512
+    path = None
+
+    if backend in ('bytesio', 'bytesio-scan'):
+        target = io.BytesIO()
+    else:
+        path = image(size, directory)
+        target = path
+
+    try:
+        with fopen(target, 'r+b') as handle:
+            stream = counter(handle)
+
+            wall = perf_counter()
+            cpu = process_time()
+
+            stream.seek(0)
+            stream.write(mbr(size, fs))
+            fat(stream, fs, size - bs, bs, 'BENCH', verify, scan=backend == 'bytesio-scan')
+
+            wall = perf_counter() - wall
+            cpu = process_time() - cpu
+    finally:
+        if path:
+            os.remove(path)
+
+    return {'fs': fs,
+            'size': size,
+            'backend': backend,
+            'wall': wall,
+            'cpu': cpu,
+            'rss': peak_rss(),
+            'written': stream.written,
+            'calls': stream.calls}
@@ -0,0 +1,95 @@
+import json, os, subprocess, sys
+from typing import Dict, List
+
+from access import access_fs
+
+
+LADDER = [16 << 20, 64 << 20, 256 << 20, 1 << 30, 4 << 30, 16 << 30, 64 << 30, 256 << 30, 1 << 40, 2 << 40]
+
+FILE_SYSTEMS = ('FAT12', 'FAT16', 'FAT32', 'exFAT')
+
+BACKENDS = ('image', 'bytesio', 'bytesio-scan')
+
+# проверка поверхности читает всю область данных, а io.BytesIO держит ее в памяти целиком
+SCAN_LIMIT = 256 << 20
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# допустимый рост метрики относительно сохраненного результата
+TOLERANCE = {'wall': 0.25, 'cpu': 0.25, 'rss': 0.25, 'written': 0.0, 'calls': 0.0}
+
+# разница меньше этой не считается регрессией (шум таймера и аллокатора)
+NOISE = {'wall': 0.05, 'cpu': 0.05, 'rss': 16 << 20, 'written': 0, 'calls': 0}
+
+
+def key(result: dict) -> str:
+    return f"{result['fs']}/{result['size']}/{result['backend']}"
+
+
+def cases(sizes: List[int]=LADDER, file_systems: List[str]=FILE_SYSTEMS, backends: List[str]=BACKENDS) -> List[tuple]:
+    '''all allowed (fs, size, backend) combinations, surface scan only on small volumes'''
+
+    return [(fs, size, backend) for size in sizes for fs in access_fs(size - 512) if fs in file_systems for backend in backends
+            if backend != 'bytesio-scan' or size <= SCAN_LIMIT]
+
+
+def measure(fs: str, size: int, backend: str, directory: str=None, verify: bool=False) -> dict:
+    '''run one case in a fresh interpreter, so peak RSS belongs to this case only'''
+
+    command = [sys.executable, '-m', 'bench', '--one', fs, str(size), backend]
+
+    if directory:
+        command += ['--dir', directory]
+
+    if verify:
+        command.append('--verify')
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run(command, cwd=root, stdout=subprocess.PIPE, check=True).stdout
+
+    return json.loads(output)
+
+
+def compare(results: List[dict], baseline: Dict[str, dict]) -> List[str]:
+    '''list of regressions against baseline'''
+
+    regressions = []
+
+    for result in results:
+        base = baseline.get(key(result))
+        if not base:
+            continue
+        for metric, tolerance in TOLERANCE.items():
+            limit = base[metric] * (1 + tolerance) + NOISE[metric]
+            if result[metric] > limit:
+                regressions.append(f'{key(result)} {metric}: {base[metric]} -> {result[metric]}')
+
+    return regressions
+
+
+def load(path: str=BASELINE) -> Dict[str, dict]:
+    if not os.path.exists(path):
+        return {}
+
+    with open(path) as f:
+        return json.load(f)
+
+
+def save(results: List[dict], path: str=BASELINE):
+    baseline = load(path)
+    baseline.update({key(result): result for result in results})
+
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=1, sort_keys=True)
+
+
+def table(results: List[dict]) -> str:
+    '''results as text table'''
+
+    lines = [f"{'fs':<6} {'size':>14} {'backend':<12} {'wall s':>8} {'cpu s':>8} {'rss MB':>8} {'written MB':>11} {'calls':>7}"]
+
+    for r in results:
+        lines.append(f"{r['fs']:<6} {r['size']:>14} {r['backend']:<12} {r['wall']:>8.3f} {r['cpu']:>8.3f} "
+                     f"{r['rss'] / (1 << 20):>8.1f} {r['written'] / (1 << 20):>11.2f} {r['calls']:>7}")
+
+    return '\n'.join(lines)
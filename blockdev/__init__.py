@@ -1 +1,2 @@
-from .scan import scan
+from .inventory import inventory
+from .scan import scan, scan_iter
@@ -8,3 +8,12 @@ class Drive(NamedTuple):
     path: str
     size: int
     error: bool = False
+    hub: str = ''
+
+
+class DiskDrive(NamedTuple):
+    # поля Win32_DiskDrive, скопированные из COM объекта для передачи в другой поток
+    Model: str
+    SerialNumber: str
+    DeviceID: str
+    Size: str
@@ -0,0 +1,47 @@
+import socket
+from typing import List, Tuple
+
+
+# NETLINK_KOBJECT_UEVENT и группа рассылки событий ядра
+NETLINK_KOBJECT_UEVENT = 15
+KERNEL_GROUP = 1
+
+
+def netlink():
+    '''socket receiving kernel uevents or None where netlink is unavailable'''
+
+    try:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+        sock.bind((0, KERNEL_GROUP))
+    except (AttributeError, OSError):
+        return None
+
+    return sock
+
+
+def uevent(message: bytes) -> Tuple[str, str]:
+    '''(action, device name) of block disk uevent or None'''
+
+    fields = dict(field.split(b'=', 1) for field in message.split(b'\0')[1:] if b'=' in field)
+
+    if fields.get(b'SUBSYSTEM') != b'block' or fields.get(b'DEVTYPE') != b'disk':
+        return None
+
+    return fields.get(b'ACTION', b'').decode(), fields.get(b'DEVNAME', b'').decode().split('/')[-1]
+
+
+def uevents(sock) -> List[Tuple[str, str]]:
+    '''block disk uevents waiting in socket'''
+
+    events = []
+
+    while True:
+        try:
+            message = sock.recv(1 << 16, socket.MSG_DONTWAIT)
+        except (BlockingIOError, InterruptedError):
+            break
+        event = uevent(message)
+        if event and event[1]:
+            events.append(event)
+
+    return events
@@ -1,13 +1,13 @@
-from wmi import _wmi_object, _wmi_namespace
+from wmi import _wmi_namespace
 
 from .dev import drive_name
-from .drive import Drive
+from .drive import DiskDrive, Drive
 from .letter import letter
 from .rename import rename
 from .size import realsize
 
 
-def info(drive: _wmi_object, WBEM: _wmi_namespace) -> Drive:
+def info(drive: DiskDrive, WBEM: _wmi_namespace) -> Drive:
     '''return blockdevice info'''
     
     name = rename(drive.Model)
@@ -0,0 +1,152 @@
+import os
+from select import select
+from threading import Event, Lock, Thread
+from typing import Callable, Dict
+
+from .drive import Drive
+from .hotplug import netlink, uevents
+from .provider import module, streamer
+
+
+class inventory(object):
+    # долгоживущий список устройств: полное сканирование один раз, дальше только
+    # добавленные и извлеченные устройства по событиям hotplug (netlink в Linux)
+    # или по опросу signature() провайдера с интервалом interval
+    # подписчики получают callback(added, removed) со словарями {имя: Drive}
+
+    def __init__(self, interval: float=1.0, platform: str=None, **kwargs):
+        self.scanner = (module(platform) if platform else module())[0]
+        self.stream = streamer(platform) if platform else streamer()
+        self.interval = interval
+        self.kwargs = kwargs
+        self.devices = {}
+        self.listeners = []
+        self.lock = Lock()
+        self.ready = Event()
+        self.stopped = Event()
+        self.thread = None
+
+    def snapshot(self) -> Dict[str, Drive]:
+        '''last known devices'''
+
+        with self.lock:
+            return dict(self.devices)
+
+    def wait(self, timeout: float=None) -> Dict[str, Drive]:
+        '''devices once the first scan finished'''
+
+        self.ready.wait(timeout)
+
+        return self.snapshot()
+
+    def subscribe(self, callback: Callable[[dict, dict], None]):
+        self.listeners.append(callback)
+
+    def apply(self, devices: Dict[str, Drive], names: list=None):
+        '''replace all devices or only those of kernel names, notify about differences'''
+
+        with self.lock:
+            if names is None:
+                old = self.devices
+            else:
+                old = {key: drive for key, drive in self.devices.items() if os.path.basename(drive.path) in names}
+            added = {key: drive for key, drive in devices.items() if old.get(key) != drive}
+            removed = {key: drive for key, drive in old.items() if key not in devices}
+            if names is None:
+                self.devices = dict(devices)
+            else:
+                for key in removed:
+                    del self.devices[key]
+                self.devices.update(added)
+
+        if added or removed:
+            for callback in self.listeners:
+                callback(added, removed)
+
+    def add(self, devices: Dict[str, Drive]):
+        '''remember devices found so far, notify about new ones'''
+
+        with self.lock:
+            added = {key: drive for key, drive in devices.items() if self.devices.get(key) != drive}
+            self.devices.update(added)
+
+        if added:
+            for callback in self.listeners:
+                callback(added, {})
+
+    def rescan(self) -> Dict[str, Drive]:
+        '''full scan with provider, devices are announced as soon as each is probed'''
+
+        found = {}
+
+        for devices in self.stream(**self.kwargs):
+            found.update(devices)
+            self.add(devices)
+
+        self.apply(found)
+        self.ready.set()
+
+        return self.snapshot()
+
+    def update(self, names: list):
+        '''probe only changed devices where provider can, full scan otherwise'''
+
+        if not hasattr(self.scanner, 'probe'):
+            self.rescan()
+            return
+
+        devices = {}
+
+        for name in names:
+            devices.update(self.scanner.probe(name, **self.kwargs))
+
+        self.apply(devices, names)
+
+    def start(self):
+        '''first scan and hotplug watch in background thread'''
+
+        if self.thread is None:
+            self.stopped.clear()
+            self.thread = Thread(target=self.watch, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def watch(self):
+        try:
+            self.rescan()
+        finally:
+            self.ready.set()
+
+        sock = netlink() if hasattr(self.scanner, 'probe') and self.kwargs.get('root', '/') == '/' else None
+
+        if sock is not None:
+            try:
+                while not self.stopped.is_set():
+                    if select([sock], [], [], self.interval)[0]:
+                        names = sorted({name for action, name in uevents(sock)})
+                        if names:
+                            self.update(names)
+            finally:
+                sock.close()
+            return
+
+        if not hasattr(self.scanner, 'signature'):
+            return
+
+        state = self.scanner.signature(**self.kwargs)
+
+        while not self.stopped.wait(self.interval):
+            current = self.scanner.signature(**self.kwargs)
+            if current == state:
+                continue
+            if isinstance(current, dict) and hasattr(self.scanner, 'probe'):
+                self.update(sorted(name for name in set(state) | set(current) if state.get(name) != current.get(name)))
+            else:
+                self.rescan()
+            state = current
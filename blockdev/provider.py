@@ -0,0 +1,46 @@
+import sys
+from importlib import import_module
+from typing import Callable, Iterator
+
+
+# поставщики списка устройств: префикс sys.platform -> (модуль, функция)
+# модуль импортируется только при первом обращении, wmi и pywin32 нужны только в Windows
+# модуль может определить signature() - дешевый снимок состояния для опроса изменений
+# и probe(name) - чтение одного устройства, тогда inventory обновляет только его
+# и stream() - генератор устройств по мере их опроса, иначе весь список отдается сразу
+PROVIDERS = {'win32': ('.windows', 'windows'),
+             'linux': ('.sysfs', 'sysfs')}
+
+
+def module(platform: str=sys.platform) -> tuple:
+    '''scanner module for platform and name of its scan function'''
+
+    for prefix, (path, name) in PROVIDERS.items():
+        if platform.startswith(prefix):
+            return import_module(path, __package__), name
+
+    raise OSError(f'No block device scanner for {platform}')
+
+
+def provider(platform: str=sys.platform) -> Callable[..., dict]:
+    '''device scanner for platform'''
+
+    scanner, name = module(platform)
+
+    return getattr(scanner, name)
+
+
+def streamer(platform: str=sys.platform) -> Callable[..., Iterator[dict]]:
+    '''device generator for platform, whole scan at once if provider can't stream'''
+
+    scanner, name = module(platform)
+
+    if hasattr(scanner, 'stream'):
+        return scanner.stream
+
+    scan = getattr(scanner, name)
+
+    def stream(**kwargs) -> Iterator[dict]:
+        yield scan(**kwargs)
+
+    return stream
@@ -0,0 +1,108 @@
+import os, re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, List
+
+from .dev import drive_name
+from .drive import Drive
+
+
+def read(path: str) -> str:
+    '''stripped content of sysfs attribute or empty string'''
+
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return ''
+
+
+def usb(device: str) -> bool:
+    '''block device sits on USB bus'''
+
+    return '/usb' in os.path.realpath(device)
+
+
+def serial(device: str, root: str) -> str:
+    '''serial number of nearest parent device that has one'''
+
+    path = os.path.realpath(os.path.join(device, 'device'))
+    top = os.path.realpath(os.path.join(root, 'sys', 'devices'))
+
+    while path.startswith(top) and path != top:
+        number = read(os.path.join(path, 'serial'))
+        if number:
+            return number
+        path = os.path.dirname(path)
+
+    return ''
+
+
+def hub(device: str) -> str:
+    '''USB hub or root hub the device is plugged into, devices of one hub share its bandwidth'''
+
+    parts = os.path.realpath(device).split(os.sep)
+    ports = [part for part in parts if re.match(r'^\d+-[\d.]+$', part)]
+
+    if len(ports) > 1:
+        return ports[-2]
+
+    return next((part for part in parts if re.match(r'^usb\d+$', part)), '')
+
+
+def partitions(device: str, name: str, root: str) -> List[str]:
+    '''device nodes of partitions'''
+
+    return [os.path.join(root, 'dev', part) for part in sorted(os.listdir(device))
+            if part.startswith(name) and os.path.exists(os.path.join(device, part, 'partition'))]
+
+
+def probe(name: str, root: str='/') -> dict:
+    '''one block device, empty if it is gone, fixed or has no media'''
+
+    device = os.path.join(root, 'sys', 'block', name)
+
+    if read(os.path.join(device, 'removable')) != '1' and not usb(device):
+        return {}
+
+    size = int(read(os.path.join(device, 'size')) or 0) * 512
+
+    if not size:
+        return {}
+
+    model = ' '.join(filter(None, (read(os.path.join(device, 'device', 'vendor')),
+                                   read(os.path.join(device, 'device', 'model')))))
+    path = os.path.join(root, 'dev', name)
+
+    return drive_name(Drive(model or name, serial(device, root), partitions(device, name, root), path, size,
+                            hub=hub(device)))
+
+
+def signature(root: str='/') -> dict:
+    '''cheap state of /sys/block to notice hotplug while polling {name: size}'''
+
+    block = os.path.join(root, 'sys', 'block')
+
+    return {name: read(os.path.join(block, name, 'size')) for name in os.listdir(block)}
+
+
+def stream(root: str='/', workers: int=8) -> Iterator[dict]:
+    '''yield removable and USB block devices as soon as each is probed'''
+
+    names = sorted(os.listdir(os.path.join(root, 'sys', 'block')))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in as_completed([pool.submit(probe, name, root) for name in names]):
+            devices = future.result()
+            if devices:
+                yield devices
+
+
+def sysfs(root: str='/', workers: int=8) -> dict:
+    '''scan removable and USB block devices in /sys/block'''
+
+    devices = {}
+
+    for found in stream(root, workers):
+        devices.update(found)
+
+    return devices
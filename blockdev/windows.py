@@ -0,0 +1,124 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from json import loads
+from platform import release
+from threading import local
+from typing import Iterator
+from pythoncom import CoInitialize
+
+from win32file import GetLogicalDrives, QueryDosDevice
+from wmi import WMI
+
+from .dev import drive_name
+from .drive import DiskDrive, Drive
+from .info import info
+from .json_loads import json_loads
+from .shell import shell
+
+
+def signature() -> tuple:
+    '''physical drives and logical drive letters, changes on hotplug without WMI'''
+
+    drives = [name for name in QueryDosDevice(None).split('\0') if name.startswith('PhysicalDrive')]
+
+    return sorted(drives), GetLogicalDrives()
+
+
+# COM объекты WMI привязаны к потоку, каждый поток пула открывает свое подключение
+connections = local()
+
+
+def connection() -> WMI:
+    '''WMI connection of current thread'''
+
+    if not hasattr(connections, 'WBEM'):
+        CoInitialize()
+        connections.WBEM = WMI()
+
+    return connections.WBEM
+
+
+def probe(drive: DiskDrive) -> dict:
+    '''letters and real size of one drive in pool thread'''
+
+    return info(drive, connection())
+
+
+def stream(workers: int=8) -> Iterator[dict]:
+    '''yield USB devices as soon as each is probed, WMI in thread pool, PowerShell as fallback'''
+    
+    found = False
+    
+    try:
+        CoInitialize()
+        WBEM = WMI()
+    
+        if not [disk.Name for disk in WBEM.Win32_LogicalDisk(DriveType = 2)]:
+            '''Quck check Removable Media'''
+
+            return
+        
+        drives = [DiskDrive(drive.Model, drive.SerialNumber, drive.DeviceID, drive.Size)
+                  for drive in WBEM.query('SELECT * FROM Win32_DiskDrive WHERE MediaType = "Removable Media"')
+                  if drive.Size]
+        
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for future in as_completed([pool.submit(probe, drive) for drive in drives]):
+                found = True
+                yield future.result()
+        
+        if found:
+            return
+
+    except Exception:
+        '''continue with PowerShell if any error or devices not found'''
+
+        if found:
+            return
+
+    if release() == '7':
+        '''this method don't work with Windows 7'''
+        
+        return
+    
+    devices = {}
+    
+    command = "Get-PhysicalDisk | Where-Object CannotPoolReason -Match 'Removable Media' | Select-Object DeviceId, FriendlyName, SerialNumber, Size | ConvertTo-Json"
+    
+    buf = shell(command)
+    
+    if buf:
+        drives = json_loads(buf)
+        command = "Get-Partition | Select-Object DiskNumber, DriveLetter | ConvertTo-Json"
+        partitions = json_loads(shell(command))
+            
+        for drive in drives:
+            '''add device and associate with letters'''
+            
+            id = int(drive['DeviceId'])
+            
+            letters = []
+
+            for partition in partitions:
+                if partition['DiskNumber'] == id:
+                    letters.append(partition["DriveLetter"] + ':')
+            
+            name = drive['FriendlyName']
+            serial = drive['SerialNumber']
+            path = f'\\\\.\\PHYSICALDRIVE{id}'
+            size = drive['Size']
+            
+            devices.update(drive_name(Drive(name, serial, letters, path, size)))
+    
+    if devices:
+        yield devices
+
+
+def windows(workers: int=8) -> dict:
+    '''scan available USB devices with WMI, PowerShell as fallback'''
+    
+    devices = {}
+    
+    for found in stream(workers):
+        devices.update(found)
+    
+    return devices
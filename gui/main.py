@@ -1,10 +1,11 @@
 from PyQt5.QtCore import QSize, QRect, Qt
 from PyQt5.QtGui import QIcon, QPixmap
-from PyQt5.QtWidgets import QMainWindow, QWidget, QGridLayout, QPushButton, QComboBox, QLabel, QLineEdit, QTextBrowser
+from PyQt5.QtWidgets import QMainWindow, QWidget, QGridLayout, QPushButton, QComboBox, QLabel, QLineEdit, QTextBrowser, QCheckBox, QProgressBar, QListWidget, QListWidgetItem
 
 from access import access_fs
 from .logo import LOGO
 from .scan import Scan
+from .station import Station
 from .write_disk import WriteDisk
 
 
@@ -13,7 +14,7 @@ class Alterfat(QMainWindow):
     def __init__(self):
         QMainWindow.__init__(self)
         
-        self.setMinimumSize(QSize(420, 440))
+        self.setMinimumSize(QSize(420, 480))
         self.setWindowTitle("AlterFAT")
         self.setWindowFlags(Qt.WindowCloseButtonHint | Qt.WindowMinimizeButtonHint)
 
@@ -25,14 +26,23 @@ class Alterfat(QMainWindow):
         self.fs = []
         
         self.scanUSB = Scan(mainwindow=self)
+        self.scanUSB.changed.connect(self.devices_changed)
+        self.scanUSB.found.connect(self.device_found)
+        self.scanUSB.finished.connect(self.fill_targets)
         self.formatUSB = WriteDisk(mainwindow=self)
         self.formatUSB.log.connect(self.logging)
+        self.formatUSB.progress.connect(self.show_progress)
+        self.formatUSB.finished.connect(self.format_done)
+        self.formatStation = Station(mainwindow=self)
+        self.formatStation.log.connect(self.logging)
+        self.formatStation.progress.connect(self.show_device_progress)
+        self.formatStation.finished.connect(self.format_done)
         
         self.centralwidget = QWidget(self)
         self.centralwidget.setObjectName("centralwidget")
         
         self.widget = QWidget(self.centralwidget)
-        self.widget.setGeometry(QRect(10, 10, 400, 420))
+        self.widget.setGeometry(QRect(10, 10, 400, 460))
         self.widget.setObjectName("widget")
         
         self.gridLayout = QGridLayout(self.widget)
@@ -70,16 +80,49 @@ class Alterfat(QMainWindow):
         self.volume_label.setObjectName("volume_label")
         self.gridLayout.addWidget(self.volume_label, 2, 1, 1, 1)
         
+        self.verify = QCheckBox(self.widget)
+        self.verify.setObjectName("verify")
+        self.verify.setText("Verify after format")
+        self.gridLayout.addWidget(self.verify, 3, 0, 1, 1)
+        
+        self.full = QCheckBox(self.widget)
+        self.full.setObjectName("full")
+        self.full.setText("Full format")
+        self.full.toggled.connect(self.select_mode)
+        self.gridLayout.addWidget(self.full, 3, 1, 1, 1)
+        
+        self.surface = QCheckBox(self.widget)
+        self.surface.setObjectName("surface")
+        self.surface.setText("Surface scan")
+        self.gridLayout.addWidget(self.surface, 4, 0, 1, 1)
+        
+        self.station_mode = QCheckBox(self.widget)
+        self.station_mode.setObjectName("station_mode")
+        self.station_mode.setText("Station mode")
+        self.station_mode.toggled.connect(self.select_station)
+        self.gridLayout.addWidget(self.station_mode, 4, 1, 1, 1)
+        
+        self.progress = QProgressBar(self.widget)
+        self.progress.setObjectName("progress")
+        self.progress.setRange(0, 100)
+        self.progress.setValue(0)
+        self.gridLayout.addWidget(self.progress, 5, 0, 1, 2)
+        
+        self.targets = QListWidget(self.widget)
+        self.targets.setObjectName("targets")
+        self.targets.setVisible(False)
+        self.gridLayout.addWidget(self.targets, 6, 0, 1, 2)
+        
         self.log = QTextBrowser(self.widget)
         self.log.setObjectName("log")
-        self.gridLayout.addWidget(self.log, 3, 0, 1, 2)
+        self.gridLayout.addWidget(self.log, 7, 0, 1, 2)
         
         self.start = QPushButton(self.widget)
         self.start.setObjectName("start")
         self.start.setText("Quick Format")
         self.start.setEnabled(False)
         self.start.clicked.connect(self.format)
-        self.gridLayout.addWidget(self.start, 4, 0, 1, 2)
+        self.gridLayout.addWidget(self.start, 8, 0, 1, 2)
         
         self.setCentralWidget(self.centralwidget)
         self.scanUSB.start()
@@ -90,6 +133,36 @@ class Alterfat(QMainWindow):
     def scan_usb(self):
         self.scanUSB.start()
 
+    def device_found(self, name, drive):
+        if self.scanUSB.isRunning() and self.devices.findText(name) < 0:
+            self.usb_devices[name] = drive
+            if self.devices.itemText(0) == 'Scanning...':
+                self.devices.removeItem(0)
+            self.devices.addItem(name)
+            self.devices.setEnabled(True)
+
+    def devices_changed(self):
+        if not self.formatUSB.isRunning() and not self.formatStation.isRunning():
+            self.scanUSB.start()
+
+    def fill_targets(self):
+        checked = self.checked_targets()
+        self.targets.clear()
+        for name in self.usb_devices:
+            item = QListWidgetItem(name, self.targets)
+            item.setData(Qt.UserRole, name)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked if name in checked else Qt.Unchecked)
+
+    def checked_targets(self):
+        return [self.targets.item(i).data(Qt.UserRole) for i in range(self.targets.count())
+                if self.targets.item(i).checkState() == Qt.Checked]
+
+    def select_station(self):
+        station = self.station_mode.isChecked()
+        self.targets.setVisible(station)
+        self.devices.setEnabled(not station)
+
     def select_fat(self):
         self.file_systems.clear()
         drive = self.devices.currentText()
@@ -103,5 +176,37 @@ class Alterfat(QMainWindow):
                 self.log.clear()
                 self.start.setEnabled(True)
 
+    def select_mode(self):
+        self.start.setText(("Quick Format", "Full Format")[self.full.isChecked()])
+
+    def show_progress(self, region, percent, speed, eta):
+        minutes, seconds = divmod(int(eta), 60)
+        self.progress.setValue(percent)
+        self.progress.setFormat(f'{region}: %p%  {speed:.1f} MB/s  ETA {minutes}:{seconds:02d}')
+
+    def show_device_progress(self, name, region, percent, speed):
+        for i in range(self.targets.count()):
+            item = self.targets.item(i)
+            if item.data(Qt.UserRole) == name:
+                item.setText(f'{name}  {region}: {percent}%  {speed:.1f} MB/s')
+
+    def format_done(self):
+        self.select_mode()
+        self.start.setEnabled(True)
+
     def format(self):
-        self.formatUSB.start()
+        if self.formatUSB.isRunning() or self.formatStation.isRunning():
+            self.formatUSB.cancel.set()
+            self.formatStation.cancel.set()
+            self.start.setEnabled(False)
+        elif self.station_mode.isChecked():
+            self.log.clear()
+            self.fill_targets()
+            self.formatStation.devices = {name: self.usb_devices[name] for name in self.checked_targets()}
+            self.start.setText("Cancel")
+            self.formatStation.start()
+        else:
+            self.progress.setValue(0)
+            self.progress.setFormat('%p%')
+            self.start.setText("Cancel")
+            self.formatUSB.start()
@@ -1,23 +1,44 @@
-from PyQt5.QtCore import QThread
+from PyQt5.QtCore import QThread, pyqtSignal
 
 import blockdev
 
 
 class Scan(QThread):
+    changed = pyqtSignal()
+    found = pyqtSignal(str, object)
 
     def __init__(self, mainwindow, parent=None):
         super().__init__()
         self.mainwindow = mainwindow
+        self.inventory = blockdev.inventory()
+        self.inventory.subscribe(self.notify)
+
+    def notify(self, added: dict, removed: dict):
+        '''device probed during first scan or plugged and removed after it'''
+
+        if self.inventory.ready.is_set():
+            self.changed.emit()
+            return
+
+        for name, drive in added.items():
+            self.found.emit(name, drive)
 
     def run(self):
         ui = self.mainwindow
         
+        current = ui.devices.currentText()
+        
         ui.devices.clear()
         ui.devices.setEnabled(False)
         
         ui.devices.addItem('Scanning...')
-        ui.usb_devices = blockdev.scan()
+        self.inventory.start()
+        ui.usb_devices = self.inventory.wait()
         
         ui.devices.clear()
         ui.devices.addItems(ui.usb_devices)
+        
+        if current in ui.usb_devices:
+            ui.devices.setCurrentText(current)
+        
         ui.devices.setEnabled(True)
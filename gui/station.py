@@ -0,0 +1,61 @@
+from threading import Event
+from time import perf_counter
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from access import access_fs
+from station import station, table
+
+
+class Station(QThread):
+    log = pyqtSignal(str)
+    progress = pyqtSignal(str, str, int, float) # device, region, percent, MB/s
+
+    def __init__(self, mainwindow, parent=None):
+        super().__init__()
+        self.mainwindow = mainwindow
+        self.cancel = Event()
+        self.devices = {}
+        self.interval = 0.2
+        self.last = {}
+
+    def report(self, name: str, region: str, done: int, total: int, speed: float):
+        '''throttled progress of every device'''
+
+        now = perf_counter()
+
+        if now - self.last.get(name, 0.0) < self.interval and done < total:
+            return
+
+        self.last[name] = now
+
+        self.progress.emit(name, region, done * 100 // total if total else 100, speed)
+
+    def run(self):
+        ui = self.mainwindow
+        
+        self.cancel.clear()
+        self.last = {}
+        
+        fs = ui.file_systems.currentText()
+        devices = {}
+        
+        for name, usb in self.devices.items():
+            if usb.error:
+                self.log.emit(f'Skip {name}: disk allready used by another program')
+            elif fs not in access_fs(usb.size):
+                self.log.emit(f'Skip {name}: {fs} is not available for this size')
+            else:
+                devices[name] = usb
+        
+        self.log.emit(f'Formatting {len(devices)} devices to {fs}...')
+        self.log.emit('')
+        
+        results = station(devices, fs, ui.volume_label.text(), progress=self.report, cancel=self.cancel,
+                          verify=ui.verify.isChecked(), full=ui.full.isChecked(), scan=ui.surface.isChecked()).run()
+        
+        for line in table(results).split('\n'):
+            self.log.emit(line)
+        
+        self.log.emit('')
+        self.log.emit('All done. Please, rescan USB devices manually')
@@ -1,25 +1,50 @@
+from threading import Event
+from time import perf_counter
+
 from PyQt5.QtCore import QThread, pyqtSignal
 
-from mkfs import fat, fopen, handle_list
+from mkfs import cancel_error, fat, fopen, handle_list, verify_error
 from mbr import mbr
 
 
 class WriteDisk(QThread):
     log = pyqtSignal(str)
+    progress = pyqtSignal(str, int, float, float) # region, percent, MB/s, ETA seconds
 
     def __init__(self, mainwindow, parent=None):
         super().__init__()
         self.mainwindow = mainwindow
+        self.cancel = Event()
+        self.interval = 0.1
+        self.last = 0.0
+
+    def report(self, region: str, done: int, total: int, speed: float):
+        '''throttled progress from the format loop'''
+
+        now = perf_counter()
+
+        if now - self.last < self.interval and done < total:
+            return
+
+        self.last = now
+
+        percent = done * 100 // total if total else 100
+        eta = (total - done) / (speed * (1 << 20)) if speed else 0.0
+
+        self.progress.emit(region, percent, speed, eta)
 
     def run(self):
         ui = self.mainwindow
         
-        ui.start.setEnabled(False)
+        self.cancel.clear()
         
         drive = ui.devices.currentText()
         usb = ui.usb_devices[drive]
         fs = ui.file_systems.currentText()
         volume_label = ui.volume_label.text()
+        verify = ui.verify.isChecked()
+        full = ui.full.isChecked()
+        scan = ui.surface.isChecked()
         
         letters = handle_list(usb.letters)
         path = usb.path
@@ -36,9 +61,20 @@ class WriteDisk(QThread):
                 self.log.emit('')
                 self.log.emit(f'Formatting partition to {fs}...')
                 self.log.emit('')
-                self.log.emit(fat(stream, fs, size - bs, bs, volume_label))
+                self.log.emit(fat(stream, fs, size - bs, bs, volume_label, verify, full, scan=scan,
+                                  progress=self.report, cancel=self.cancel))
                 self.log.emit('')
+                if verify:
+                    self.log.emit('Verify success')
+                    self.log.emit('')
                 self.log.emit('All done. Please, rescan USB devices manually')
+        except cancel_error:
+            self.log.emit('')
+            self.log.emit('Format cancelled. Partition is not usable, please format it again')
+        except verify_error as e:
+            self.log.emit('')
+            self.log.emit(str(e))
+            self.log.emit('Device lost written data. Possibly fake or failing media')
         except:
             self.log.emit('')
             self.log.emit('Any error. Please, rescan USB and try again')
@@ -1,16 +1,25 @@
+from .afi import afi
+from .clustermap import clustermap
+from .defrag import defrag
+from .error import cancel_error, mkfs_error, verify_error
 from .exfat import exfat
+from .export import export
 from .fat import fat
 from .fopen import fopen
+from .fsck import fsck
 from .handle import handle_list
+from .inject import inject
+from .reader import reader
+from .usage import usage
 
 
-def fat12(stream: fopen, size: int, offset: int=0, volume_label: str='') -> str:
-    return fat(stream, 'FAT12', size, offset, volume_label)
+def fat12(stream: fopen, size: int, offset: int=0, volume_label: str='', **kwargs) -> str:
+    return fat(stream, 'FAT12', size, offset, volume_label, **kwargs)
 
 
-def fat16(stream: fopen, size: int, offset: int=0, volume_label: str='') -> str:
-    return fat(stream, 'FAT16', size, offset, volume_label)
+def fat16(stream: fopen, size: int, offset: int=0, volume_label: str='', **kwargs) -> str:
+    return fat(stream, 'FAT16', size, offset, volume_label, **kwargs)
 
 
-def fat32(stream: fopen, size: int, offset: int=0, volume_label: str='') -> str:
-    return fat(stream, 'FAT32', size, offset, volume_label)
+def fat32(stream: fopen, size: int, offset: int=0, volume_label: str='', **kwargs) -> str:
+    return fat(stream, 'FAT32', size, offset, volume_label, **kwargs)
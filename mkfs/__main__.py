@@ -0,0 +1,50 @@
+import sys
+from argparse import ArgumentParser
+
+from .export import create, export
+
+
+def size(text: str) -> int:
+    '''16M, 4G, 2T or plain bytes'''
+
+    factors = {'K': 10, 'M': 20, 'G': 30, 'T': 40}
+
+    if text[-1].upper() in factors:
+        return int(text[:-1]) << factors[text[-1].upper()]
+
+    return int(text)
+
+
+def main():
+    parser = ArgumentParser(prog='python -m mkfs', description='AlterFAT image export to stdout or file, written strictly sequentially')
+    parser.add_argument('fs', choices=('FAT12', 'FAT16', 'FAT32', 'exFAT'))
+    parser.add_argument('size', type=size)
+    parser.add_argument('--label', default='')
+    parser.add_argument('--no-mbr', action='store_true', help='volume without partition table')
+    parser.add_argument('-o', '--output', help='file instead of stdout, .afi stores compressed container')
+    parser.add_argument('--prealloc', nargs=2, metavar=('COUNT', 'SIZE'), help='contiguous files for loop recording')
+    parser.add_argument('--prealloc-dir', default='', help='directory of preallocated files')
+    parser.add_argument('--prealloc-name', default='FILE%04d.DAT', help='name pattern of preallocated files')
+    args = parser.parse_args()
+
+    prealloc = None
+
+    if args.prealloc:
+        prealloc = {'count': int(args.prealloc[0]), 'size': size(args.prealloc[1]), 'directory': args.prealloc_dir,
+                    'name': args.prealloc_name}
+
+    if args.output and args.output.endswith('.afi'):
+        info = create(args.output, args.fs, args.size, args.label, not args.no_mbr, prealloc=prealloc)
+    elif args.output:
+        with open(args.output, 'wb') as out:
+            info = export(out, args.fs, args.size, args.label, not args.no_mbr, prealloc=prealloc)
+    else:
+        info = export(sys.stdout.buffer, args.fs, args.size, args.label, not args.no_mbr, prealloc=prealloc)
+
+    print(info, file=sys.stderr)
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
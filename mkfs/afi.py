@@ -0,0 +1,198 @@
+import io, zlib
+from bisect import bisect_right
+from hashlib import blake2b
+from struct import Struct
+from typing import Callable, Iterator, List, Tuple
+
+from .journal import journal
+from .meter import meter
+
+
+# контейнер образа AlterFAT (.afi): хранятся только ненулевые блоки, каждый сжат zlib
+# заголовок: сигнатура, версия, размер образа, размер блока
+# блоки данных, за ними сжатый индекс (позиция, длина, смещение, сжатая длина),
+# в конце трейлер со смещением индекса, одинаковые блоки хранятся один раз
+MAGIC = b'AFI\x1a'
+VERSION = 1
+HEADER = Struct('<4sHHQI4x')
+ENTRY = Struct('<QIQI')
+TRAILER = Struct('<QQI4s')
+
+
+def journal_blocks(stream: journal, block: int) -> Iterator[Tuple[int, bytes]]:
+    '''non-zero extents of in-memory image cut on block boundaries'''
+
+    for start, end, data in stream.extents:
+        if data is None:
+            continue
+        position = start
+        while position < end:
+            lenght = min(block - position % block, end - position)
+            if isinstance(data, bytes):
+                yield position, data[position - start:position - start + lenght]
+            else:
+                yield position, data.chunk(position, lenght)
+            position += lenght
+
+
+def file_blocks(f, size: int, block: int) -> Iterator[Tuple[int, bytes]]:
+    '''blocks of raw image file'''
+
+    f.seek(0)
+
+    for position in range(0, size, block):
+        yield position, f.read(min(block, size - position))
+
+
+def save(path: str, blocks: Iterator[Tuple[int, bytes]], size: int, block: int=1 << 16, level: int=6,
+         progress: Callable=None, cancel: object=None) -> int:
+    '''write container from (position, data) blocks in offset order, zero blocks are dropped'''
+
+    index = []
+    stored = {}
+    stat = meter(size, 'Pack', progress, cancel)
+
+    with open(path, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, VERSION, 0, size, block))
+        for position, data in blocks:
+            stat.update(len(data))
+            if data.count(0) == len(data):
+                continue
+            digest = blake2b(data).digest()
+            if digest not in stored:
+                packed = zlib.compress(data, level)
+                stored[digest] = (out.tell(), len(packed))
+                out.write(packed)
+            index.append(ENTRY.pack(position, len(data), *stored[digest]))
+        offset = out.tell()
+        packed = zlib.compress(b''.join(index), level)
+        out.write(packed)
+        out.write(TRAILER.pack(offset, len(packed), len(index), MAGIC))
+
+        return out.tell()
+
+
+def convert(path: str, raw: str, block: int=1 << 16, progress: Callable=None, cancel: object=None) -> int:
+    '''pack raw image file into container'''
+
+    with open(raw, 'rb') as f:
+        size = f.seek(0, 2)
+        return save(path, file_blocks(f, size, block), size, block, progress=progress, cancel=cancel)
+
+
+class afi(object):
+    # чтение контейнера как файла: seek/read/tell, нули между блоками не хранятся
+    # поиск блока двоичный по индексу, последний распакованный блок кэшируется
+    # extents() заменяет SEEK_DATA, chunk() позволяет записать контейнер в journal для readback
+
+    def __init__(self, path: str, mode: str='rb'):
+        if mode != 'rb':
+            raise io.UnsupportedOperation(f'{path}: .afi images are read-only')
+        self.path = path
+        self.mode = mode
+        self.handle = open(path, 'rb')
+        magic, version, flags, self.size, self.block = HEADER.unpack(self.handle.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            self.handle.close()
+            raise ValueError(f'{path}: not an AlterFAT image container')
+        self.handle.seek(-TRAILER.size, 2)
+        offset, lenght, count, magic = TRAILER.unpack(self.handle.read(TRAILER.size))
+        if magic != MAGIC:
+            self.handle.close()
+            raise ValueError(f'{path}: container is truncated')
+        self.handle.seek(offset)
+        index = zlib.decompress(self.handle.read(lenght))
+        self.entries = [ENTRY.unpack_from(index, i * ENTRY.size) for i in range(count)]
+        self.starts = [entry[0] for entry in self.entries]
+        self.cache = (-1, b'')
+        self.pos = 0
+
+    def extents(self) -> List[Tuple[int, int]]:
+        '''stored regions merged, everything else reads as zeros'''
+
+        out = []
+
+        for position, lenght, offset, packed in self.entries:
+            if out and out[-1][1] == position:
+                out[-1] = (out[-1][0], position + lenght)
+            else:
+                out.append((position, position + lenght))
+
+        return out
+
+    def unpack(self, i: int) -> bytes:
+        if self.cache[0] != i:
+            position, lenght, offset, packed = self.entries[i]
+            self.handle.seek(offset)
+            self.cache = (i, zlib.decompress(self.handle.read(packed)))
+
+        return self.cache[1]
+
+    def chunk(self, position: int, lenght: int) -> bytes:
+        '''image bytes of region [position, position + lenght)'''
+
+        end = min(position + lenght, self.size)
+        out = bytearray(max(end - position, 0))
+        i = max(bisect_right(self.starts, position) - 1, 0)
+
+        while i < len(self.entries) and self.entries[i][0] < end:
+            start, size = self.entries[i][:2]
+            if start + size > position:
+                a = max(start, position)
+                b = min(start + size, end)
+                out[a - position:b - position] = self.unpack(i)[a - start:b - start]
+            i += 1
+
+        return bytes(out)
+
+    def journal(self, stream=None) -> journal:
+        '''expected content of stored regions for readback() against stream'''
+
+        expected = journal(stream, self.size)
+
+        for start, end in self.extents():
+            expected.record(start, end, self)
+
+        return expected
+
+    def seek(self, position, stop=0):
+        if stop == 1:
+            position += self.pos
+        elif stop == 2:
+            position += self.size
+        self.pos = position
+        return self.pos
+
+    def read(self, lenghts=None):
+        if lenghts is None or lenghts < 0:
+            lenghts = self.size - self.pos
+        byteOut = self.chunk(self.pos, lenghts)
+        self.pos += len(byteOut)
+        return byteOut
+
+    def write(self, byteObj):
+        raise io.UnsupportedOperation(f'{self.path}: .afi images are read-only')
+
+    def flush(self):
+        pass
+
+    def tell(self):
+        return self.pos
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return False
+
+    def seekable(self):
+        return True
+
+    def close(self):
+        self.handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -1,4 +1,40 @@
-from struct import unpack_from, calcsize, pack
+from struct import Struct, calcsize
+
+
+class codec(object):
+    # макет записи {смещение: (имя, формат)}, скомпилированный один раз на класс:
+    # чтение всех полей одним Struct с пропусками, запись по непрерывным группам полей,
+    # чтобы не затирать байты между полями (загрузочный код и т.п.)
+
+    def __init__(self, layout: dict):
+        self.layout = layout
+        self.names = tuple(layout[offset][0] for offset in sorted(layout))
+        self.groups = [] # [(offset, Struct, names)]
+        fmt = '<'
+        pos = 0
+        for offset in sorted(layout):
+            name, code = layout[offset]
+            code = code.lstrip('<')
+            if offset != pos or not self.groups:
+                if offset > pos:
+                    fmt += '%dx' % (offset - pos)
+                self.groups.append([offset, '<', []])
+            self.groups[-1][1] += code
+            self.groups[-1][2].append(name)
+            fmt += code
+            pos = offset + calcsize('<' + code)
+        self.struct = Struct(fmt)
+        self.groups = [(offset, Struct(code), tuple(names)) for offset, code, names in self.groups]
+
+    def decode(self, c, s, base=0):
+        "Sets all fields of c from buffer s"
+        for name, value in zip(self.names, self.struct.unpack_from(s, base)):
+            setattr(c, name, value)
+
+    def encode(self, c, s, base=0):
+        "Stores all fields of c in buffer s, bytes between fields are left untouched"
+        for offset, group, names in self.groups:
+            group.pack_into(s, base + offset, *[getattr(c, name) for name in names])
 
 
 def class2str(c, s):
@@ -14,15 +50,6 @@ def class2str(c, s):
     return s
 
 
-def common_getattr(c, name):
-    "Decodes and stores an attribute following special class layout"
-    i = c._vk[name]
-    fmt = c._kv[i][1]
-    cnt = unpack_from(fmt, c._buf, i+c._i) [0]
-    setattr(c, name,  cnt)
-    return cnt
-
-
 class boot_fat16(object):
     "FAT12/16 Boot Sector"
     layout = { # { offset: (name, unpack string) }
@@ -49,15 +76,15 @@ class boot_fat16(object):
     0x1FE: ('wBootSignature', '<H') # 55 AA
     } # Size = 0x200 (512 byte)
 
+    _codec = codec(layout)
+    _kv = layout
+    __slots__ = _codec.names + ('_pos', '_buf', 'stream', 'cluster', 'fatoffs', 'fatsize', 'rootoffs', 'dataoffs', 'dwRootCluster')
+
     def __init__ (self, s=None, offset=0, stream=None):
-        self._i = 0
         self._pos = offset # base offset
         self._buf = s or bytearray(512) # normal boot sector size
         self.stream = stream
-        self._kv = self.layout.copy()
-        self._vk = {} # { name: offset}
-        for k, v in list(self._kv.items()):
-            self._vk[v[0]] = k
+        self._codec.decode(self, self._buf)
         self.__init2__()
 
     def __init2__(self):
@@ -76,15 +103,12 @@ class boot_fat16(object):
         # Set for compatibility with FAT32 code
         self.dwRootCluster = 0
 
-    __getattr__ = common_getattr
-
     def __str__ (self):
         return class2str(self, "FAT12/16 Boot Sector @%x\n" % self._pos)
 
     def pack(self):
         "Updates internal buffer"
-        for k, v in list(self._kv.items()):
-            self._buf[k:k+calcsize(v[1])] = pack(v[1], getattr(self, v[0]))
+        self._codec.encode(self, self._buf)
         self.__init2__()
         return self._buf
 
@@ -141,15 +165,15 @@ class boot_fat32(object):
     0x1FE: ('wBootSignature', '<H') # 55 AA
     } # Size = 0x200 (512 byte)
 
+    _codec = codec(layout)
+    _kv = layout
+    __slots__ = _codec.names + ('_pos', '_buf', 'stream', 'cluster', 'fatoffs', 'dataoffs', 'fatsize', 'fsinfo')
+
     def __init__ (self, s=None, offset=0, stream=None):
-        self._i = 0
         self._pos = offset # base offset
         self._buf = s or bytearray(512) # normal boot sector size
         self.stream = stream
-        self._kv = self.layout.copy()
-        self._vk = {} # { name: offset}
-        for k, v in list(self._kv.items()):
-            self._vk[v[0]] = k
+        self._codec.decode(self, self._buf)
         self.__init2__()
 
     def __init2__(self):
@@ -167,15 +191,12 @@ class boot_fat32(object):
         else:
             self.fsinfo = None
 
-    __getattr__ = common_getattr
-
     def __str__ (self):
         return class2str(self, "FAT32 Boot Sector @%x\n" % self._pos)
 
     def pack(self):
         "Updates internal buffer"
-        for k, v in list(self._kv.items()):
-            self._buf[k:k+calcsize(v[1])] = pack(v[1], getattr(self, v[0]))
+        self._codec.encode(self, self._buf)
         self.__init2__()
         return self._buf
 
@@ -207,22 +228,19 @@ class fat32_fsinfo(object):
     0x1FE: ('wBootSignature', '<H') # 55 AA
     } # Size = 0x200 (512 byte)
 
+    _codec = codec(layout)
+    _kv = layout
+    __slots__ = _codec.names + ('_pos', '_buf', 'stream')
+
     def __init__ (self, s=None, offset=0, stream=None):
-        self._i = 0
         self._pos = offset # base offset
         self._buf = s or bytearray(512) # normal FSInfo sector size
         self.stream = stream
-        self._kv = self.layout.copy()
-        self._vk = {} # { name: offset}
-        for k, v in list(self._kv.items()):
-            self._vk[v[0]] = k
-
-    __getattr__ = common_getattr
+        self._codec.decode(self, self._buf)
 
     def pack(self):
         "Updates internal buffer"
-        for k, v in list(self._kv.items()):
-            self._buf[k:k+calcsize(v[1])] = pack(v[1], getattr(self, v[0]))
+        self._codec.encode(self, self._buf)
         return self._buf
 
     def __str__ (self):
@@ -256,15 +274,15 @@ class boot_exfat(object):
     0x71: ('chReserved', '7s'),
     0x1FE: ('wBootSignature', '<H') } # Size = 0x200 (512 byte)
 
+    _codec = codec(layout)
+    _kv = layout
+    __slots__ = _codec.names + ('_pos', '_buf', 'stream', 'cluster', 'fatoffs', 'fatsize', 'dataoffs', 'bitmap')
+
     def __init__ (self, s=None, offset=0, stream=None):
-        self._i = 0
         self._pos = offset # base offset
         self._buf = s or bytearray(512) # normal boot sector size
         self.stream = stream
-        self._kv = self.layout.copy()
-        self._vk = {} # { name: offset}
-        for k, v in list(self._kv.items()):
-            self._vk[v[0]] = k
+        self._codec.decode(self, self._buf)
         self.__init2__()
 
     def __init2__(self):
@@ -278,12 +296,9 @@ class boot_exfat(object):
         # Data region offset (=cluster #2)
         self.dataoffs = self.dwDataRegionOffset * (1 << self.uchBytesPerSector) + self._pos
 
-    __getattr__ = common_getattr
-
     def pack(self):
         "Updates internal buffer"
-        for k, v in list(self._kv.items()):
-            self._buf[k:k+calcsize(v[1])] = pack(v[1], getattr(self, v[0]))
+        self._codec.encode(self, self._buf)
         self.__init2__()
         return self._buf
 
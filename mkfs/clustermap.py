@@ -0,0 +1,316 @@
+import sys
+from array import array
+from bisect import bisect_right
+from struct import unpack_from
+from typing import Dict, Iterator, List, Tuple
+
+from .exfs import SLOT_CODES
+from .reader import directory, gather, volume
+
+
+# байт -> 1, если он не нулевой; вариант для старшего байта записи FAT32, где значимы только 28 бит
+NONZERO = bytes([0] + [1] * 255)
+NONZERO28 = bytes(1 if b & 0x0F else 0 for b in range(256))
+
+# байт битовой карты exFAT -> 8 байт по одному на кластер
+BITS = [bytes((b >> k) & 1 for k in range(8)) for b in range(256)]
+
+
+def mask(data: bytes, fat32: bool) -> bytes:
+    '''one byte per 32 bit entry: 1 where entry is not zero, whole lanes are merged as big integers'''
+
+    value = 0
+
+    for lane in range(4):
+        table = NONZERO28 if fat32 and lane == 3 else NONZERO
+        value |= int.from_bytes(data[lane::4].translate(table), 'little')
+
+    return value.to_bytes(len(data) // 4, 'little')
+
+
+def both(a: bytes, b: bytes, invert: bool=False) -> bytes:
+    '''a and b (or a and not b) of 0/1 masks'''
+
+    x = int.from_bytes(a, 'little')
+    y = int.from_bytes(b, 'little')
+
+    if invert:
+        y = ~y
+
+    return (x & y).to_bytes(len(a), 'little')
+
+
+def entries(data: bytes) -> array:
+    '''32 bit FAT entries as array'''
+
+    out = array(SLOT_CODES[4], data)
+
+    if sys.byteorder == 'big':
+        out.byteswap()
+
+    return out
+
+
+def breaks(data: bytes, exfat: bool) -> bytes:
+    '''one byte per entry: 1 where entry i does not link to i + 1, found by xor with identity chain'''
+
+    identity = array(SLOT_CODES[4], range(1, len(data) // 4 + 1))
+
+    if sys.byteorder == 'big':
+        identity.byteswap()
+
+    xor = int.from_bytes(data, 'little') ^ int.from_bytes(identity.tobytes(), 'little')
+
+    return mask(xor.to_bytes(len(data), 'little'), not exfat)
+
+
+def bad(data: bytes, exfat: bool) -> bytes:
+    '''one byte per entry: 1 where cluster is marked bad'''
+
+    out = bytearray(len(data) // 4)
+    pattern = b'\xF7\xFF\xFF' + (b'\xFF' if exfat else b'')
+    i = data.find(pattern)
+
+    while i >= 0:
+        if not i % 4 and (exfat or data[i + 3] & 0x0F == 0x0F):
+            out[i // 4] = 1
+        i = data.find(pattern, i + 1)
+
+    return bytes(out)
+
+
+class clustermap(object):
+    # карта принадлежности кластеров, построенная одним последовательным чтением FAT
+    # starts/counts - все участки цепочек по возрастанию кластера, following - номер
+    # следующего участка цепочки или -1, chain - номер первого участка своей цепочки или -1 для петель
+    # в exFAT файлы без цепочки FAT (NoFatChain) добавляются обходом каталогов, paths - голова -> путь
+
+    def __init__(self, stream, walk: bool=True):
+        self.boot, self.table = volume(stream, mapfree=False)
+        self.stream = self.boot.stream
+        self.exfat = bool(self.table.exfat)
+        self.cluster = self.boot.cluster
+        self.clusters = self.table.size
+        self.last = self.table.last if self.exfat else 0x0FFFFFF8
+        self.paths = {self.boot.dwRootCluster: '/'}
+        self.contiguous = []
+        self.load()
+        self.build(self.scan())
+
+        if walk or self.exfat:
+            self.walk('/', self.extents(self.boot.dwRootCluster), {self.boot.dwRootCluster})
+
+        if self.exfat:
+            self.build(self.merge())
+
+    def load(self):
+        '''FAT in one read, masks of breaks, bad and allocated clusters'''
+
+        self.stream.seek(self.boot.fatoffs if self.exfat else self.boot.fat())
+        data = self.stream.read(4 * (self.clusters + 2))
+
+        self.fat = entries(data)
+        self.breaks = breaks(data, self.exfat)
+        self.bad = bad(data, self.exfat)
+        self.allocated = both(b'\x00\x00' + mask(data, not self.exfat)[2:], self.bad, True)
+
+        if self.exfat:
+            # записи FAT exFAT вне битовой карты - мусор освобожденных файлов
+            self.allocated = both(self.allocated, self.bitmap())
+
+    def bitmap(self) -> bytes:
+        '''exFAT allocation bitmap, one byte per cluster, names of bitmap and upcase table'''
+
+        root = gather(self.boot, self.follow(self.boot.dwRootCluster))
+        data = b''
+
+        for i in range(0, len(root), 32):
+            if root[i] not in (0x81, 0x82):
+                continue
+            start, lenght = unpack_from('<IQ', root, i + 0x14)
+            if not 2 <= start <= self.clusters + 1:
+                continue
+            self.paths[start] = ('$Bitmap', '$UpCase')[root[i] - 0x81]
+            runs = self.follow(start) if self.fat[start] else [(start, (lenght + self.cluster - 1) // self.cluster)]
+            if not self.fat[start]:
+                self.contiguous.extend(runs)
+            if root[i] == 0x81:
+                data = gather(self.boot, runs)[:lenght]
+
+        return (b'\x00\x00' + b''.join(map(BITS.__getitem__, data)))[:self.clusters + 2].ljust(self.clusters + 2, b'\x00')
+
+    def follow(self, start: int) -> List[Tuple[int, int]]:
+        '''runs of FAT chain from breaks mask, used before the map is built'''
+
+        runs = []
+        cluster = start
+
+        while 2 <= cluster <= self.clusters + 1 and sum(count for a, count in runs) <= self.clusters:
+            end = self.breaks.find(1, cluster)
+            end = self.clusters + 1 if end < 0 else end
+            runs.append((cluster, end - cluster + 1))
+            cluster = self.fat[end] & (0xFFFFFFFF if self.exfat else 0x0FFFFFFF)
+
+        return runs
+
+    def scan(self) -> List[Tuple[int, int, int]]:
+        '''(start, count, next cluster) of every run of allocated clusters'''
+
+        runs = []
+        allocated = self.allocated
+        top = self.clusters + 1
+        value = 0xFFFFFFFF if self.exfat else 0x0FFFFFFF
+        start = allocated.find(1, 2)
+
+        while start >= 0:
+            end = self.breaks.find(1, start)
+            end = top if end < 0 else end
+            hole = allocated.find(0, start, end + 1)
+            if hole >= 0:
+                end = hole - 1
+            runs.append((start, end - start + 1, self.fat[end] & value))
+            start = allocated.find(1, end + 1)
+
+        return runs
+
+    def merge(self) -> List[Tuple[int, int, int]]:
+        '''contiguous exFAT files and FAT chains reachable from directories,
+        FAT entries of exFAT outside live chains are left by freed files and are dropped'''
+
+        runs = set((start, count, self.last) for start, count in self.contiguous)
+        heads = set(start for start, count in self.contiguous)
+
+        for head in self.paths:
+            if head in heads:
+                continue
+            for start, count in self.follow(head):
+                runs.add((start, count, self.fat[start + count - 1]))
+
+        return sorted(runs)
+
+    def split(self, runs: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+        '''runs cut where another run links into their middle'''
+
+        targets = sorted(set(following for start, count, following in runs if following < self.last))
+        out = []
+
+        for start, count, following in runs:
+            i = bisect_right(targets, start)
+            cut = start
+            while i < len(targets) and targets[i] < start + count:
+                out.append((cut, targets[i] - cut, targets[i]))
+                cut = targets[i]
+                i += 1
+            out.append((cut, start + count - cut, following))
+
+        return out
+
+    def build(self, runs: List[Tuple[int, int, int]]):
+        '''index, links and chain of every run'''
+
+        runs = self.split(runs)
+        self.starts = array('L', (start for start, count, following in runs))
+        self.counts = array('L', (count for start, count, following in runs))
+        self.nexts = array('L', (following for start, count, following in runs))
+        self.index = {start: i for i, start in enumerate(self.starts)}
+
+        following = array('l', (self.index.get(value, -1) if value < self.last else -1 for value in self.nexts))
+        pointed = bytearray(len(runs))
+
+        for i in following:
+            if i >= 0:
+                pointed[i] = 1
+
+        self.following = following
+        self.chain = array('l', [-1]) * len(runs)
+        self.heads = []
+
+        for head in range(len(runs)):
+            if pointed[head]:
+                continue
+            self.heads.append(self.starts[head])
+            i = head
+            while i >= 0 and self.chain[i] < 0:
+                self.chain[i] = head
+                i = following[i]
+
+    def walk(self, path: str, runs: List[Tuple[int, int]], visited: set):
+        '''names of chain heads, contiguous exFAT files and directories collected on the way'''
+
+        d = directory(None, self.cluster, self.exfat)
+
+        if self.exfat:
+            d.parse_exfat(gather(self.boot, runs))
+        else:
+            d.parse_fat(gather(self.boot, runs))
+
+        d.done = True
+
+        for found in d:
+            if not 2 <= found.cluster <= self.clusters + 1:
+                continue
+            name = path.rstrip('/') + '/' + found.name
+            if self.exfat and found.contig:
+                extents = [(found.cluster, max(1, (found.size + self.cluster - 1) // self.cluster))]
+                self.contiguous.append(extents[0])
+            else:
+                extents = self.extents(found.cluster)
+            self.paths[found.cluster] = name
+            if found.dir and found.cluster not in visited:
+                visited.add(found.cluster)
+                self.walk(name, extents, visited)
+
+    def run(self, cluster: int) -> int:
+        '''index of run holding cluster or -1'''
+
+        i = bisect_right(self.starts, cluster) - 1
+
+        if i >= 0 and cluster < self.starts[i] + self.counts[i]:
+            return i
+
+        return -1
+
+    def owner(self, cluster: int) -> int:
+        '''first cluster of chain owning cluster, 0 for free or unreachable clusters'''
+
+        i = self.run(cluster)
+
+        if i < 0 or self.chain[i] < 0:
+            return 0
+
+        return self.starts[self.chain[i]]
+
+    def path(self, cluster: int) -> str:
+        '''name of file owning cluster, empty when unknown'''
+
+        return self.paths.get(self.owner(cluster), '')
+
+    def extents(self, head: int) -> List[Tuple[int, int]]:
+        '''(start, count) runs of chain from its first cluster in chain order'''
+
+        i = self.index.get(head, -1)
+        out = []
+
+        while i >= 0 and len(out) <= len(self.starts):
+            out.append((self.starts[i], self.counts[i]))
+            i = self.following[i]
+
+        return out
+
+    def files(self) -> Iterator[Tuple[int, List[Tuple[int, int]]]]:
+        '''(first cluster, extents) of every chain'''
+
+        for head in self.heads:
+            yield head, self.extents(head)
+
+    def fragmentation(self, top: int=10) -> Dict[str, object]:
+        '''chains, fragmented chains, runs and the most fragmented files'''
+
+        fragments = [(len(self.extents(head)), head) for head in self.heads]
+        fragmented = [(count, head) for count, head in fragments if count > 1]
+        fragmented.sort(reverse=True)
+
+        return {'chains': len(fragments),
+                'fragmented': len(fragmented),
+                'runs': len(self.starts),
+                'worst': [(self.paths.get(head, hex(head)), count) for count, head in fragmented[:top]]}
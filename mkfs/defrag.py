@@ -0,0 +1,549 @@
+from bisect import bisect_right, insort
+from struct import pack_into, unpack_from
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from .clustermap import clustermap
+from .entryset import rotate
+from .error import mkfs_error
+from .fsck import fsck
+from .meter import meter
+from .reader import gather, volume
+from .usage import store
+
+
+def located(data: bytes, exfat: bool) -> Iterator[Tuple[int, int, int, int, bool, bool]]:
+    '''(offset, lenght, first cluster, size, contiguous, directory) of every entry in directory data'''
+
+    i = 0
+
+    while i + 32 <= len(data):
+        first = data[i]
+        if not first:
+            return
+        if exfat:
+            if first != 0x85:
+                i += 32
+                continue
+            lenght = (data[i + 1] + 1) * 32
+            if i + lenght > len(data):
+                return
+            cluster, size = unpack_from('<IQ', data, i + 0x34)
+            yield i, lenght, cluster, size, bool(data[i + 33] & 2), bool(data[i + 4] & 0x10)
+            i += lenght
+            continue
+        attributes = data[i + 11]
+        if first != 0xE5 and attributes != 0x0F and not attributes & 0x08 and first != 0x2E:
+            cluster = unpack_from('<H', data, i + 20)[0] << 16 | unpack_from('<H', data, i + 26)[0]
+            yield i, 32, cluster, unpack_from('<I', data, i + 28)[0], False, bool(attributes & 0x10)
+        i += 32
+
+
+def merged(runs: List[List[int]]) -> List[List[int]]:
+    '''chain runs with physically adjacent neighbours joined'''
+
+    out = []
+
+    for start, count in runs:
+        if out and sum(out[-1]) == start:
+            out[-1][1] += count
+        else:
+            out.append([start, count])
+
+    return out
+
+
+class defrag(object):
+    # дефрагментация тома FAT32/exFAT без монтирования: файлы по порядку укладываются вплотную
+    # от начала тома, кластеры чужих файлов в окне укладки вытесняются в свободное место в конце тома,
+    # так что файлы становятся непрерывными, а свободное место собирается одним участком в хвосте;
+    # место перед каталогом, в которое файл не помещается, занимают следующие файлы, которые в него
+    # входят целиком, а если таких нет - файл продолжается за каталогом
+    # каждый перенос идет в свободные кластеры и пишется в порядке: данные, новая цепочка (биты карты),
+    # ссылка на нее из предыдущего кластера или записи каталога, освобождение старого участка,
+    # поэтому прерванная дефрагментация оставляет целый том; каталоги не переносятся
+    # free - свободные участки по возрастанию, owners - участки переносимых файлов, walls - все остальное
+
+    def __init__(self, stream, chunk: int=1 << 22, consolidate: bool=True, progress: Callable=None,
+                 cancel: object=None):
+        self.source = stream
+        self.boot, self.table = volume(stream)
+        self.stream = self.boot.stream
+        self.exfat = bool(self.table.exfat)
+        self.cluster = self.boot.cluster
+        self.chunk = max(1, chunk // self.cluster) * self.cluster
+        self.consolidate = consolidate
+        self.stat = meter(0, 'Defrag', progress, cancel)
+        self.allocator = self.boot.bitmap if self.exfat else self.table
+        self.allocator.map_compact()
+        self.free = sorted([start, count] for start, count in self.allocator.free_clusters_map.items() if count > 0)
+        self.starts = [start for start, count in self.free]
+        self.owners = {}
+        self.held = []
+        self.files = []
+        self.touched = set()
+        self.converted = 0
+        self.copied = 0
+
+    def gap(self, cluster: int) -> int:
+        '''free clusters from cluster on, 0 if cluster is in use'''
+
+        i = bisect_right(self.starts, cluster) - 1
+
+        if i >= 0 and cluster < sum(self.free[i]):
+            return sum(self.free[i]) - cluster
+
+        return 0
+
+    def cut(self, start: int, count: int):
+        '''take clusters [start, start + count) out of free run holding them'''
+
+        i = bisect_right(self.starts, start) - 1
+        first, lenght = self.free[i]
+        pieces = [[first, start - first], [start + count, first + lenght - start - count]]
+        pieces = [piece for piece in pieces if piece[1] > 0]
+        self.free[i:i + 1] = pieces
+        self.starts[i:i + 1] = [piece[0] for piece in pieces]
+
+    def give(self, start: int, count: int):
+        '''return run to free list merging it with neighbours'''
+
+        i = bisect_right(self.starts, start)
+
+        if i and sum(self.free[i - 1]) == start:
+            i -= 1
+            self.free[i][1] += count
+        else:
+            self.free.insert(i, [start, count])
+            self.starts.insert(i, start)
+
+        if i + 1 < len(self.free) and sum(self.free[i]) == self.starts[i + 1]:
+            self.free[i][1] += self.free[i + 1][1]
+            del self.free[i + 1], self.starts[i + 1]
+
+    def fit(self, count: int) -> int:
+        '''smallest free run of at least count clusters, 0 if none, large runs are left for large files'''
+
+        best = None
+
+        for start, lenght in self.free:
+            if count <= lenght and (best is None or lenght < best[1]):
+                best = start, lenght
+                if lenght == count:
+                    break
+
+        return best[0] if best else 0
+
+    def spare(self, count: int, low: int, high: int) -> Tuple[int, int]:
+        '''top clusters of the highest free run outside [low, high), up to count of them'''
+
+        for start, lenght in reversed(self.free):
+            end = start + lenght
+            if end > high:
+                lenght = end - max(start, high)
+            elif end > low:
+                lenght = low - start
+                end = low
+            if lenght > 0:
+                lenght = min(lenght, count)
+                return end - lenght, lenght
+
+        return 0, 0
+
+    def occupy(self, start: int, count: int, file: dict):
+        insort(self.held, start)
+        self.owners[start] = (count, file)
+
+    def vacate(self, start: int, count: int):
+        '''forget owner of clusters [start, start + count), rest of its runs is kept'''
+
+        i = bisect_right(self.held, start) - 1
+
+        while count:
+            first = self.held[i]
+            lenght, file = self.owners.pop(first)
+            del self.held[i]
+            end = min(first + lenght, start + count)
+            if first < start:
+                self.occupy(first, start - first, file)
+                i += 1
+            if end < first + lenght:
+                self.occupy(end, first + lenght - end, file)
+            count -= end - start
+            start = end
+
+    def holder(self, cluster: int) -> Tuple[dict, int]:
+        '''file owning cluster and clusters of its run from cluster on'''
+
+        i = bisect_right(self.held, cluster) - 1
+
+        if i >= 0:
+            first = self.held[i]
+            lenght, file = self.owners[first]
+            if cluster < first + lenght:
+                return file, first + lenght - cluster
+
+        return None, 0
+
+    def positions(self, runs: List[Tuple[int, int]], offset: int, lenght: int) -> List[int]:
+        '''device position of every 32 byte slot of entry at offset in directory made of runs'''
+
+        out = []
+
+        for position in range(offset, offset + lenght, 32):
+            for start, count in runs:
+                if position < count * self.cluster:
+                    out.append(self.boot.cl2offset(start) + position)
+                    break
+                position -= count * self.cluster
+
+        return out
+
+    def walk(self, runs: List[Tuple[int, int]], visited: set):
+        '''files of directory tree with their entries and runs'''
+
+        data = gather(self.boot, runs)
+
+        for offset, lenght, cluster, size, contig, directory in located(data, self.exfat):
+            if not 2 <= cluster <= self.map.clusters + 1:
+                continue
+            count = max(1, (size + self.cluster - 1) // self.cluster)
+            if self.exfat and contig:
+                extents = [(cluster, count)]
+            else:
+                extents = self.map.extents(cluster)
+            if directory:
+                if cluster not in visited:
+                    visited.add(cluster)
+                    self.walk(extents, visited)
+                continue
+            if sum(k for start, k in extents) != count:
+                continue
+            self.files.append({'path': self.map.paths.get(cluster, hex(cluster)), 'count': count, 'contig': contig,
+                               'raw': bytearray(data[offset:offset + lenght]),
+                               'slots': self.positions(runs, offset, lenght),
+                               'runs': merged([list(extent) for extent in extents])})
+
+    def fixed(self):
+        '''runs of clusters neither free nor held by movable files: directories, system files, bad clusters'''
+
+        used = sorted(self.free + [[start, self.owners[start][0]] for start in self.held])
+        cluster = 2
+        self.walls = []
+
+        for start, count in used + [[self.map.clusters + 2, 0]]:
+            if start > cluster:
+                self.walls.append((cluster, start))
+            cluster = max(cluster, start + count)
+
+        self.wallstarts = [start for start, end in self.walls]
+
+    def room(self, cluster: int) -> Tuple[int, int]:
+        '''first cluster from cluster on outside fixed runs and count of clusters before next fixed run'''
+
+        i = bisect_right(self.wallstarts, cluster)
+
+        if i and cluster < self.walls[i - 1][1]:
+            cluster = self.walls[i - 1][1]
+
+        end = self.wallstarts[i] if i < len(self.walls) else self.map.clusters + 2
+
+        return cluster, max(0, end - cluster)
+
+    def span(self, cluster: int, count: int) -> List[List[int]]:
+        '''runs of count clusters from cluster on stepping over fixed runs, empty if volume ends first'''
+
+        out = []
+
+        while count:
+            cluster, lenght = self.room(cluster)
+            if not lenght:
+                return []
+            lenght = min(lenght, count)
+            out.append([cluster, lenght])
+            cluster += lenght
+            count -= lenght
+
+        return out
+
+    def copy(self, runs: List[List[int]], target: int):
+        '''copy runs to target with chunk sized sequential reads and writes'''
+
+        position = self.boot.cl2offset(target)
+
+        for start, count in runs:
+            source = self.boot.cl2offset(start)
+            lenght = count * self.cluster
+            for i in range(0, lenght, self.chunk):
+                self.stream.seek(source + i)
+                block = self.stream.read(min(self.chunk, lenght - i))
+                self.stream.seek(position)
+                self.stream.write(block)
+                position += len(block)
+                self.copied += len(block)
+                self.stat.update(len(block))
+
+    def entry(self, file: dict, cluster: int, contig: bool=None):
+        '''point directory entry to cluster, exFAT NoFatChain flag is set or cleared when contig is given'''
+
+        raw = file['raw']
+
+        if self.exfat:
+            if contig is not None:
+                raw[33] = raw[33] | 3 if contig else raw[33] & ~2
+                file['contig'] = contig
+            pack_into('<I', raw, 0x34, cluster)
+            pack_into('<H', raw, 2, rotate(raw[4:], rotate(raw[:2])))
+        else:
+            pack_into('<H', raw, 20, cluster >> 16)
+            pack_into('<H', raw, 26, cluster & 0xFFFF)
+
+        for i, position in enumerate(file['slots']):
+            self.stream.seek(position)
+            self.stream.write(bytes(raw[i * 32:i * 32 + 32]))
+
+    def release(self, start: int, count: int):
+        if self.exfat:
+            self.allocator.set(start, count, clear=True)
+        else:
+            self.table.mark_run(start, count, clear=True)
+
+        self.vacate(start, count)
+        self.give(start, count)
+
+    def move(self, file: dict, target: int):
+        '''copy whole file to free run at target, link it and release old runs'''
+
+        count = file['count']
+        self.copy(file['runs'], target)
+        self.cut(target, count)
+
+        if self.exfat:
+            self.allocator.set(target, count)
+        else:
+            self.table.mark_run(target, count)
+
+        self.entry(file, target, True)
+
+        for start, lenght in file['runs']:
+            self.release(start, lenght)
+
+        self.occupy(target, count, file)
+        file['runs'] = [[target, count]]
+        self.touched.add(file['path'])
+
+    def relocate(self, file: dict, index: int, count: int, target: int):
+        '''move count clusters of file from cluster number index of its chain to free run at target'''
+
+        if count == file['count']:
+            return self.move(file, target)
+
+        runs = file['runs']
+        j = 0
+
+        while index >= runs[j][1]:
+            index -= runs[j][1]
+            j += 1
+
+        start, lenght = runs[j]
+        source = start + index
+
+        if self.exfat and file['contig']:
+            # часть файла NoFatChain уходит отдельно: сначала пишется цепочка FAT, затем снимается флаг
+            self.table.mark_run(start, lenght)
+            self.entry(file, start, False)
+
+        self.copy([[source, count]], target)
+        self.cut(target, count)
+
+        if self.exfat:
+            self.allocator.set(target, count)
+
+        self.table.mark_run(target, count)
+
+        if index + count < lenght:
+            self.table[target + count - 1] = source + count
+        elif j + 1 < len(runs):
+            self.table[target + count - 1] = runs[j + 1][0]
+
+        if index:
+            self.table[source - 1] = target
+        elif j:
+            self.table[sum(runs[j - 1]) - 1] = target
+        else:
+            self.entry(file, target)
+
+        self.release(source, count)
+        self.occupy(target, count, file)
+
+        pieces = [[start, index], [target, count], [source + count, lenght - index - count]]
+        file['runs'] = merged(runs[:j] + [piece for piece in pieces if piece[1] > 0] + runs[j + 1:])
+        self.touched.add(file['path'])
+
+    def index(self, file: dict, cluster: int) -> int:
+        '''number of cluster in chain of file'''
+
+        index = 0
+
+        for start, count in file['runs']:
+            if start <= cluster < start + count:
+                return index + cluster - start
+            index += count
+
+        return -1
+
+    def evict(self, cluster: int, count: int, low: int, high: int) -> bool:
+        '''move clusters of file holding cluster out of [low, high), False when there is no room'''
+
+        file, lenght = self.holder(cluster)
+        count = min(count, lenght)
+
+        while count:
+            target, lenght = self.spare(count, low, high)
+            if not target:
+                return False
+            self.relocate(file, self.index(file, cluster), lenght, target)
+            cluster += lenght
+            count -= lenght
+
+        return True
+
+    def hole(self, file: dict, cluster: int) -> int:
+        '''free clusters between cluster and file lying in one run after them, 0 if there are other clusters'''
+
+        first = file['runs'][0][0]
+
+        if len(file['runs']) == 1 and first > cluster and self.gap(cluster) >= first - cluster:
+            return first - cluster
+
+        return 0
+
+    def pick(self, pending: List[dict], cluster: int, room: int) -> dict:
+        '''next file to lay at cluster: the one in order, or the largest later file filling space before
+        fixed run it does not fit into, or hole smaller than copy chunk in front of it'''
+
+        file = pending[0]
+        limit = room if file['count'] > room else 0
+        hole = self.hole(file, cluster)
+
+        if hole * self.cluster < self.chunk:
+            limit = limit or hole
+
+        fits = [other for other in pending[1:] if other['count'] <= limit]
+
+        return max(fits, key=lambda f: f['count']) if fits else file
+
+    def place(self, file: dict, cluster: int) -> int:
+        '''lay file down from cluster on continuing past fixed runs, return first cluster after placed part'''
+
+        count = file['count']
+        spans = self.span(cluster, count)
+
+        if not spans:
+            return cluster
+
+        low, high = spans[0][0], sum(spans[-1])
+        hole = self.hole(file, low)
+
+        if hole and hole * self.cluster < self.chunk:
+            # сдвиг на дыру меньше блока копирования дробил бы файл на мелкие переносы,
+            # файл целиком уходит в свободное место за окном и возвращается одним переносом
+            target, lenght = self.spare(count, low, high)
+            if lenght == count:
+                self.move(file, target)
+
+        index = 0
+
+        for start, total in spans:
+            cluster = start
+            end = start + total
+            while cluster < end:
+                runs = file['runs']
+                j = 0
+                skip = index
+                while skip >= runs[j][1]:
+                    skip -= runs[j][1]
+                    j += 1
+                first, lenght = runs[j]
+                if first + skip == cluster:
+                    step = min(lenght - skip, end - cluster)
+                    cluster += step
+                    index += step
+                    continue
+                free = self.gap(cluster)
+                if free:
+                    free = min(free, lenght - skip, end - cluster)
+                    self.relocate(file, index, free, cluster)
+                    cluster += free
+                    index += free
+                    continue
+                if not self.evict(cluster, end - cluster, low, high):
+                    return cluster
+
+        return cluster
+
+    def compact(self):
+        '''lay files one after another from start of volume in order of their first cluster,
+        so that free space is left in one run after the last of them'''
+
+        self.fixed()
+        pending = sorted(self.files, key=lambda f: f['runs'][0][0])
+        cluster = 2
+
+        while pending:
+            cluster, room = self.room(cluster)
+            file = self.pick(pending, cluster, room)
+            pending.remove(file)
+            cluster = self.place(file, cluster)
+
+    def pack(self):
+        '''move fragmented files whole into best fitting free runs'''
+
+        for file in sorted(self.files, key=lambda f: f['count'], reverse=True):
+            if len(file['runs']) > 1:
+                target = self.fit(file['count'])
+                if target:
+                    self.move(file, target)
+
+    def report(self, built: clustermap) -> Dict[str, object]:
+        return dict(built.fragmentation(), free_runs=len(self.free),
+                    largest_free=max((count for start, count in self.free), default=0))
+
+    def run(self) -> Dict[str, object]:
+        '''defragment files, consolidate free space, report fragments before and after'''
+
+        checked = fsck(self.source).check()
+
+        if not checked['ok']:
+            raise mkfs_error('Volume has errors, defragmentation refused: ' + '; '.join(checked['errors'][:4]))
+
+        self.map = clustermap(self.source)
+        before = self.report(self.map)
+        self.walk(self.map.extents(self.boot.dwRootCluster), {self.boot.dwRootCluster})
+
+        for file in self.files:
+            for start, count in file['runs']:
+                self.occupy(start, count, file)
+
+        if self.consolidate:
+            self.compact()
+        else:
+            self.pack()
+
+        free = len(self.free)
+
+        for file in self.files:
+            if self.exfat and len(file['runs']) == 1 and not file['contig']:
+                # непрерывная цепочка FAT в exFAT описывается флагом NoFatChain
+                self.entry(file, file['runs'][0][0], True)
+                self.converted += 1
+
+        store(self.boot, sum(count for start, count in self.free), self.starts[0] if self.free else 0xFFFFFFFF)
+
+        self.stream.flush()
+
+        if self.consolidate and free > before['free_runs']:
+            raise mkfs_error(f'Free space not consolidated: {before["free_runs"]} runs before, {free} after')
+
+        return {'fs': 'exFAT' if self.exfat else 'FAT32', 'before': before, 'after': self.report(clustermap(self.source)),
+                'moved': len(self.touched), 'converted': self.converted, 'bytes': self.copied,
+                'skipped': [file['path'] for file in self.files if len(file['runs']) > 1]}
@@ -0,0 +1,91 @@
+from itertools import chain
+from struct import Struct
+
+from .error import exFATException
+from .exfs import exFATDirentry
+
+
+# File Entry, Stream Extension и начало Filename Extension одного набора записей
+FILE_ENTRY = Struct('<BBHH2sIIIBB9s')
+STREAM_EXTENSION = Struct('<BBBBHHQ4sIQ')
+NAME_EXTENSION = Struct('<BB30s')
+
+
+def rotate(data, total: int=0) -> int:
+    '''exFAT 16 bit rotate-add sum, shared by name hash and entry set checksum'''
+
+    for c in data:
+        total = (((total >> 1) | (total << 15)) + c) & 0xFFFF
+
+    return total
+
+
+class entryset(object):
+    # каталог exFAT, собираемый целиком в памяти: наборы записей упаковываются сразу
+    # в буфер размером в целое число кластеров, хеши имен и контрольные суммы
+    # считаются одним проходом при сборке, повтор имени (без учета регистра) находится по индексу хешей
+
+    def __init__(self, cluster: int):
+        self.cluster = cluster
+        self.items = []
+        self.index = {}
+        self.lenght = 0
+        self.stamp = exFATDirentry.GetDosDateTimeEx()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def add(self, name: str, attributes: int=0x20, cluster: int=0, size: int=0, contig: bool=False,
+            valid: int=None) -> int:
+        '''queue entry set of file or directory, return its index,
+        valid - written part of file (ValidDataLength), whole size by default'''
+
+        if not 0 < len(name) <= 255 or not exFATDirentry.IsValidDosName(name):
+            raise exFATException(f'{name!r}: invalid exFAT file name')
+
+        encoded = name.encode('utf_16_le')
+        upper = name.upper().encode('utf_16_le')
+        key = rotate(upper)
+        same = self.index.setdefault(key, [])
+
+        if upper in same:
+            raise exFATException(f'{name}: duplicate name in directory')
+
+        same.append(upper)
+        self.items.append((encoded, key, attributes, cluster, size, contig, size if valid is None else valid))
+        self.lenght += 64 + (len(encoded) + 29) // 30 * 32
+
+        return len(self.items) - 1
+
+    def place(self, index: int, cluster: int, size: int, contig: bool=False, valid: int=None):
+        '''set data of entry set added before its clusters were allocated'''
+
+        encoded, key, attributes = self.items[index][:3]
+        self.items[index] = (encoded, key, attributes, cluster, size, contig, size if valid is None else valid)
+
+    def clusters(self, extra: int=0) -> int:
+        '''clusters for queued entry sets after extra bytes already used, never zero'''
+
+        return max(1, (extra + self.lenght + self.cluster - 1) // self.cluster)
+
+    def pack(self, extra: int=0) -> bytearray:
+        '''entry sets padded with zeros up to clusters(extra) minus extra bytes'''
+
+        out = bytearray(self.clusters(extra) * self.cluster - extra)
+        ctime, cms = self.stamp
+        i = 0
+
+        for encoded, key, attributes, cluster, size, contig, valid in self.items:
+            names = (len(encoded) + 29) // 30
+            start = i
+            FILE_ENTRY.pack_into(out, i, 0x85, 1 + names, 0, attributes, b'', ctime, ctime, ctime, cms, cms, b'')
+            STREAM_EXTENSION.pack_into(out, i + 32, 0xC0, 3 if contig else 1, 0, len(encoded) // 2, key, 0, valid, b'',
+                                       cluster, size)
+            i += 64
+            for k in range(0, len(encoded), 30):
+                NAME_EXTENSION.pack_into(out, i, 0xC1, 0, encoded[k:k + 30])
+                i += 32
+            view = memoryview(out)[start:i]
+            out[start + 2:start + 4] = rotate(chain(view[:2], view[4:])).to_bytes(2, 'little')
+
+        return out
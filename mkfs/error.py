@@ -2,3 +2,30 @@ class mkfs_error(Exception):
     '''partition not allowed'''
     
     pass
+
+
+class FATException(mkfs_error):
+    '''FAT structures inconsistent or exhausted'''
+
+    pass
+
+
+class exFATException(FATException):
+    '''exFAT structures inconsistent or exhausted'''
+
+    pass
+
+
+class verify_error(mkfs_error):
+    '''written data not confirmed by read-back'''
+
+    def __init__(self, lba: list):
+        self.lba = lba
+        super().__init__('Verify failed at LBA ' + ', '.join(f'{first}-{last}' for first, last in lba))
+
+
+class cancel_error(mkfs_error):
+    '''format cancelled by user'''
+
+    def __init__(self):
+        super().__init__('Format cancelled')
@@ -2,15 +2,22 @@ from importlib import import_module
 from locale import getpreferredencoding
 from math import log
 from struct import pack, pack_into
+from typing import Callable
 
 from .base import nodos_asm_78h
 from .boot import boot_exfat
 from .dostime import GetDosDateTimeEx
-from .error import mkfs_error
+from .error import mkfs_error, verify_error
 from .exfs import *
+from .fill import fill
 from .fopen import fopen
 from .info import fs_info
+from .inject import fits, prealloc as preallocate
+from .journal import journal
 from .label import exLabel
+from .readback import readback
+from .reader import view
+from .surface import bad_clusters, surface
 
 
 def gen_upcase(internal=0):
@@ -108,8 +115,14 @@ def ex_size(clusters: int, sector: int, cluster_size: int, fat_copies: int, rese
     return fat_size, required_size
 
 
-def exfat(stream: fopen, size: int, offset: int=0, volume_label: str='') -> str:
-    '''Make exFAT File System'''
+def exfat(stream: fopen, size: int, offset: int=0, volume_label: str='', verify: bool=False,
+          full: bool=False, pattern: bytes=b'\x00', scan: bool=False, progress: Callable=None, cancel: object=None,
+          prealloc: dict=None) -> str:
+    '''Make exFAT File System
+    prealloc - {count, size, directory, name} of contiguous NoFatChain files created right after format'''
+
+    if verify:
+        stream = journal(stream)
 
     sector = 512
     sectors = size // sector
@@ -148,6 +161,12 @@ def exfat(stream: fopen, size: int, offset: int=0, volume_label: str='') -> str:
 
     fsinfo = allowed[calc_cluster(size)]
 
+    if prealloc:
+        # свежий том свободен одним участком за битовой картой, UpCase и корневым каталогом
+        cluster = fsinfo['cluster_size']
+        system = ((fsinfo['clusters'] + 7) // 8 + cluster - 1) // cluster + (len(gen_upcase_compressed()) + cluster - 1) // cluster + 1
+        fits([fsinfo['clusters'] - system], cluster, True, **prealloc)
+
     boot = boot_exfat(offset=offset)
     boot.chJumpInstruction = b'\xEB\x76\x90'
     boot._buf[0x78:0x78 + len(nodos_asm_78h)] = nodos_asm_78h
@@ -170,8 +189,16 @@ def exfat(stream: fopen, size: int, offset: int=0, volume_label: str='') -> str:
 
     boot.__init2__()
 
-    stream.seek(boot.fatoffs)
-    stream.write(bytes(sector * boot.dwFATLength - offset))
+    speed = 0.0
+
+    if full:
+        speed = fill(stream, boot.dataoffs, offset + size - boot.dataoffs, pattern, region='Full format', progress=progress, cancel=cancel).speed
+
+    if scan:
+        bad = surface(stream, boot.dataoffs, offset + size - boot.dataoffs, pattern if full else None, progress=progress, cancel=cancel)
+        bad = bad_clusters(bad, boot.dataoffs, boot.cluster, boot.dwDataRegionLength + 1)
+
+    fill(stream, boot.fatoffs, sector * boot.dwFATLength, region='FAT', progress=progress, cancel=cancel)
 
     clus_0_2 = b'\xF8\xFF\xFF\xFF\xFF\xFF\xFF\xFF'
     stream.seek(boot.fatoffs)
@@ -183,8 +210,8 @@ def exfat(stream: fopen, size: int, offset: int=0, volume_label: str='') -> str:
     bitmap.dwStartCluster = 2
     bitmap.u64DataLength = (boot.dwDataRegionLength + 7) // 8
 
-    stream.seek(boot.cl2offset(bitmap.dwStartCluster))
-    stream.write(bytes(boot.cluster * ((bitmap.u64DataLength + boot.cluster - 1) // boot.cluster)))
+    fill(stream, boot.cl2offset(bitmap.dwStartCluster), boot.cluster * ((bitmap.u64DataLength + boot.cluster - 1) // boot.cluster),
+         region='Bitmap', progress=progress, cancel=cancel)
 
     start = bitmap.dwStartCluster + (bitmap.u64DataLength + boot.cluster - 1) // boot.cluster
 
@@ -230,6 +257,17 @@ def exfat(stream: fopen, size: int, offset: int=0, volume_label: str='') -> str:
 
     boot.bitmap = bmp
 
+    bad_count = None
+
+    if scan:
+        for start, count in bad.items():
+            if start <= boot.dwRootCluster:
+                raise mkfs_error('System area cluster is bad')
+            fat.mark_run(start, count, bad=True)
+            bmp.set(start, count)
+
+        bad_count = sum(bad.values())
+
     b = bytearray(32)
     if volume_label:
         volume_label = exLabel(volume_label)
@@ -246,6 +284,20 @@ def exfat(stream: fopen, size: int, offset: int=0, volume_label: str='') -> str:
     
     stream.flush()
 
+    if prealloc:
+        reserved = preallocate(view(stream, offset), progress=progress, cancel=cancel, **prealloc)
+
+    if verify:
+        lba = readback(stream, progress=progress, cancel=cancel)
+        if lba:
+            raise verify_error(lba)
+
     free_clusters = boot.dwDataRegionLength - (bitmap.u64DataLength + boot.cluster - 1) // boot.cluster - (upcase.u64DataLength + boot.cluster - 1) // boot.cluster - 1
 
-    return fs_info('exFAT', volume_label, boot.dwVolumeSerial, free_clusters, boot.cluster, fsinfo)
+    if bad_count:
+        free_clusters -= bad_count
+
+    if prealloc:
+        free_clusters = reserved['free_clusters']
+
+    return fs_info('exFAT', volume_label, boot.dwVolumeSerial, free_clusters, boot.cluster, fsinfo, speed, bad_count)
@@ -1,8 +1,30 @@
-import atexit
+import copy
 import struct
+import sys
+from array import array
 from collections import OrderedDict
+from datetime import datetime
 
-from .boot import class2str, common_getattr
+from .boot import class2str, codec
+from .error import FATException, exFATException
+from .fat12 import pack12, unpack12
+from .spans import spans
+
+
+# array typecodes of 16 and 32 bit FAT slots
+SLOT_CODES = {2: 'H', 4: 'I' if array('I').itemsize == 4 else 'L'}
+
+# FAT slots encoded per write by mark_run
+RUN_CHUNK = 1 << 20
+
+
+def encode_run(first: int, count: int, last: int, size: int) -> bytes:
+    "Encodes count consecutive little endian FAT slots first, first+1, ... ending with last"
+    run = array(SLOT_CODES[size], range(first, first+count))
+    run[-1] = last
+    if sys.byteorder == 'big':
+        run.byteswap()
+    return run.tobytes()
 
 
 class exFATDirentry:
@@ -50,7 +72,7 @@ class exFATDirentry:
     0x01: ('chSecondaryCount', 'B'), # other slots in the group (2 minimum, max 18)
     0x02: ('wChecksum', '<H'), # slots group checksum
     0x04: ('wFileAttributes', '<H'), # usual MS-DOS file attributes (0x10 = DIR, etc.)
-    0x06: ('sReserved2', '2s'),
+    0x06: ('sReserved1', '2s'),
     0x08: ('dwCTime', '<I'), # date/time in canonical MS-DOS format
     0x0C: ('dwMTime', '<I'),
     0x10: ('dwATime', '<I'),
@@ -91,33 +113,31 @@ class exFATDirentry:
     0x40: (stream_extension_layout, "Stream Extension"),
     0x41: (file_name_extension_layout, "Filename Extension") }
 
+    # a File Entry is decoded together with the Stream Extension slot following it
+    file_entry_set_layout = dict(file_entry_layout)
+    file_entry_set_layout.update((k+32, v) for k, v in stream_extension_layout.items() if k in (1,3,4,8,0x14,0x18))
+
+    # layouts compiled once per slot type
+    slot_codecs = dict((k, codec(v[0])) for k, v in slot_types.items())
+    slot_codecs[0x05] = codec(file_entry_set_layout)
+
+    __slots__ = tuple(sorted(set(name for c in slot_codecs.values() for name in c.names))) + ('_buf', '_pos', '_kv', '_name', '_codec', 'type')
+
     def __init__ (self, s, pos=-1):
-        self._i = 0
         self._buf = s
         self._pos = pos
-        self._kv = {}
         self.type = self._buf[0] & 0x7F
-        if self.type == 0 or self.type not in self.slot_types:
-            pass
-        self._kv = self.slot_types[self.type][0].copy() # select right slot type
+        self._codec = self.slot_codecs[self.type] # select right slot type
+        self._kv = self._codec.layout
         self._name = self.slot_types[self.type][1]
-        self._vk = {} # { name: offset}
-        for k, v in list(self._kv.items()):
-            self._vk[v[0]] = k
-        if self.type == 5:
-            for k in (1,3,4,8,0x14,0x18):
-                self._kv[k+32] = self.stream_extension_layout[k]
-                self._vk[self.stream_extension_layout[k][0]] = k+32
-
-    __getattr__ = common_getattr
+        self._codec.decode(self, self._buf)
 
     def __str__ (self):
         return class2str(self, "%s @%x\n" % (self._name, self._pos))
 
     def pack(self):
         "Update internal buffer"
-        for k, v in list(self._kv.items()):
-            self._buf[k:k+struct.calcsize(v[1])] = struct.pack(v[1], getattr(self, v[0]))
+        self._codec.encode(self, self._buf)
         if self.type == 5:
             self.wChecksum = self.GetSetChecksum(self._buf) # update the slots set checksum
             self._buf[2:4] = struct.pack('<H', self.wChecksum)
@@ -228,33 +248,26 @@ class exFATDirentry:
         self.wFileAttributes = 0x20
         ctime, cms = self.GetDosDateTimeEx()
         self.dwCTime = self.dwMTime = self.dwATime = ctime
-        self.chmsCTime = self.chmsMTime = self.chmsATime = cms
+        self.chmsCTime = self.chmsMTime = cms # no 10 ms field for access time
         # Stream Extension part
         self.chSecondaryFlags = 1 # base value, to show the entry could be allocated
         name = name.encode('utf_16_le')
         self.chNameLength = len(name)//2
         self.wNameHash = self.GetNameHash(name)
 
-        self.pack()
+        # File Name Extension(s) part, built at once and checksummed by a single pack()
+        slots = bytearray(32 * ((len(name)+29)//30))
+        for k in range(0, len(name), 30):
+            slots[k//30*32] = 0xC1
+            slots[k//30*32+2:k//30*32+2+len(name[k:k+30])] = name[k:k+30]
+        self._buf[64:] = slots
 
-        # File Name Extension(s) part
-        i = len(name)
-        k = 0
-        while i:
-            b = bytearray(32)
-            b[0] = 0xC1
-            j = min(30, i)
-            b[2:2+j] = name[k:k+j]
-            i-=j
-            k+=j
-            self._buf += b
-
-        return self._buf
+        return self.pack()
 
 
 class FAT:
     "Decodes a FAT (12, 16, 32 o EX) table on disk"
-    def __init__ (self, stream, offset, clusters, bitsize=32, exfat=0):
+    def __init__ (self, stream, offset, clusters, bitsize=32, exfat=0, mapfree=True):
         self.stream = stream
         self.size = clusters # total clusters in the data area (max = 2^x - 11)
         self.bits = bitsize # cluster slot bits (12, 16 or 32)
@@ -287,11 +300,13 @@ class FAT:
         # clusters ranges from 2 to 2+n-1 clusters (zero based), so last valid index is n+1
         self.real_last = min(self.reserved-1, self.size+2-1)
         self.decoded = {} # {cluster index: cluster content}
+        self.spans = spans() # runs marked by mark_run, one interval per run
         self.last_free_alloc = 2 # last free cluster allocated (also set in FAT32 FSInfo)
         self.free_clusters = None # tracks free clusters
         # ordered (by disk offset) dictionary {first_cluster: run_length} mapping free space
         self.free_clusters_map = None
-        self.map_free_space()
+        if mapfree: # a freshly formatted FAT needs no scan
+            self.map_free_space()
         self.free_clusters_flag = 1
         
     def __str__ (self):
@@ -305,6 +320,8 @@ class FAT:
             return self.last
         slot = self.decoded.get(index)
         if slot: return slot
+        slot = self.spans.get(index)
+        if slot is not None: return slot
         pos = self.offset+(index*self.bits)//8
         self.stream.seek(pos)
         slot = struct.unpack(self.fat_slot_fmt, self.stream.read(self.fat_slot_size))[0]
@@ -332,6 +349,7 @@ class FAT:
             return
             raise FATException("Attempt to set invalid cluster index 0x%X with value 0x%X" % (index, value))
         self.decoded[index] = value
+        self.spans.cut(index, index+1)
         dsp = (index*self.bits)//8
         pos = self.offset+dsp
         if self.bits == 12:
@@ -427,6 +445,25 @@ class FAT:
         startpos = self.stream.tell()
         self.free_clusters_map = {}
         FREE_CLUSTERS=0
+        if self.bits == 12:
+            # FAT12 is max 6K: decode it whole and look for zeroed slots
+            self.stream.seek(self.offset)
+            entries = unpack12(self.stream.read((self.size+3)//2*3))[2:self.size+2]
+            i = 0
+            while True:
+                try:
+                    i = entries.index(0, i)
+                except ValueError:
+                    break
+                j = i+1
+                while j < len(entries) and not entries[j]:
+                    j += 1
+                FREE_CLUSTERS += j-i
+                self.free_clusters_map[i+2] = j-i
+                i = j
+            self.stream.seek(startpos)
+            self.free_clusters = FREE_CLUSTERS
+            return FREE_CLUSTERS, len(self.free_clusters_map)
         if self.bits < 32:
             # FAT16 is max 130K...
             PAGE = self.offset2 - self.offset - (2*self.bits)//8
@@ -453,23 +490,6 @@ class FAT:
                             j += 2
                             if run_length > 0: break
                             continue
-                    elif self.bits == 12:
-                        # Pick the 12 bits wanted
-                        #     0        1        2
-                        # AAAAAAAA AAAABBBB BBBBBBBB
-                        if not j%3:
-                            if s[j] != 0 or s[j+1]>>4 != 0:
-                                j += 1
-                                if run_length > 0: break
-                                continue
-                        elif j%3 == 1:
-                            j+=1
-                            continue # simply skips median byte
-                        else: # j%3==2
-                            if s[j] != 0 or s[j-1] & 0x0FFF != 0:
-                                j += 1
-                                if run_length > 0: break
-                                continue
                     if first_free < 0:
                         first_free = (i-self.offset+j)*8//self.bits
                         run_length = 0
@@ -520,53 +540,71 @@ class FAT:
             break
         self.free_clusters_flag = 0
         
-    # TODO: split very large runs
     # About 12% faster injecting a Python2 tree
-    def mark_run(self, start, count, clear=False, offset=0):
-        "Marks a range of consecutive FAT clusters (optimized for FAT16/32)"
+    def mark_run(self, start, count, clear=False, offset=0, bad=False):
+        "Marks a range of consecutive FAT clusters"
         if not count: return
         if start<2 or start>self.real_last:
             return
-        if self.bits == 12:
-            if clear == True:
-                self.free_clusters_flag = 1
-                self.free_clusters_map[start] = count
-            while count:
-                self[start] = (start+1, 0)[clear==True]
-                start+=1
-                count-=1
-            return
-        dsp = (start*self.bits)//8
-        pos = self.offset+dsp
-        self.stream.seek(pos + offset)
+        self.forget(start, start+count)
         if clear:
-            for i in range(start, start+count):
-                self.decoded[i] = 0
-            run = bytearray(count*(self.bits//8))
-            self.stream.write(run)
+            self.spans.add(start, start+count, 0, 0, 0)
             self.free_clusters_flag = 1
             self.free_clusters_map[start] = count
-            if self.exfat: return # exFAT has one FAT only (default)
+        elif bad:
+            self.spans.add(start, start+count, self.bad, 0, self.bad)
+        else:
+            # consecutive values to set, the run is cached as a single interval
+            self.spans.add(start, start+count, start+1, 1, self.last)
+        if self.bits == 12:
+            self.mark_run12(start, count, clear, offset, bad)
+            return
+        size = self.fat_slot_size
+        # very large runs are encoded and written RUN_CHUNK slots at a time
+        for i in range(start, start+count, RUN_CHUNK):
+            n = min(RUN_CHUNK, start+count-i)
+            if clear:
+                run = bytes(n*size)
+            elif bad:
+                run = struct.pack(self.fat_slot_fmt, self.bad)*n
+            else:
+                run = encode_run(i+1, n, (i+n, self.last)[i+n == start+count], size)
+            dsp = i*size
+            self.stream.seek(self.offset+dsp + offset)
+            self.stream.write(run)
+            if self.exfat: continue # exFAT has one FAT only (default)
             # updating FAT2, too!
             self.stream.seek(self.offset2+dsp + offset)
             self.stream.write(run)
-            return
-        # consecutive values to set
-        L = range(start+1, start+1+count)
-        for i in L:
-            self.decoded[i-1] = i
-        self.decoded[start+count-1] = self.last
-        # converted in final LE WORD/DWORD array
-        L = [struct.pack(self.fat_slot_fmt, x) for x in L]
-        L[-1] = struct.pack(self.fat_slot_fmt, self.last)
-        run = bytearray().join(L)
+
+    def mark_run12(self, start, count, clear=False, offset=0, bad=False):
+        "Marks a FAT12 run decoding its 3 byte pairs once and writing both copies"
+        first = start//2*2
+        end = (start+count+1)//2*2
+        dsp = first*3//2
+        self.stream.seek(self.offset+dsp + offset)
+        entries = unpack12(self.stream.read((end-first)*3//2))
+        if clear:
+            entries[start-first:start-first+count] = [0]*count
+        elif bad:
+            entries[start-first:start-first+count] = [self.bad]*count
+        else:
+            entries[start-first:start-first+count] = list(range(start+1, start+count)) + [self.last]
+        run = pack12(entries)
+        self.stream.seek(self.offset+dsp + offset)
         self.stream.write(run)
-        if self.exfat: return # exFAT has one FAT only (default)
-        # updating FAT2, too!
-        pos = self.offset2+dsp
-        self.stream.seek(pos + offset)
+        self.stream.seek(self.offset2+dsp + offset)
         self.stream.write(run)
 
+    def forget(self, start, end):
+        "Drops single decoded slots in range [start, end)"
+        if len(self.decoded) < end-start:
+            keys = [i for i in self.decoded if start <= i < end]
+        else:
+            keys = [i for i in range(start, end) if i in self.decoded]
+        for i in keys:
+            del self.decoded[i]
+
     def alloc(self, runs_map, count, params={}):
         """Allocates a set of free clusters, marking the FAT.
         runs_map is the dictionary of previously allocated runs
@@ -0,0 +1,85 @@
+from functools import lru_cache
+from typing import Callable
+
+from mbr import mbr
+from .afi import journal_blocks, save
+from .fat import fat
+from .journal import journal
+from .meter import meter
+
+
+@lru_cache(maxsize=4)
+def zeros(lenght: int) -> memoryview:
+    '''shared zero buffer, gaps of any size are written as its slices'''
+
+    return memoryview(bytes(lenght))
+
+
+def emit(out, image: journal, size: int, chunk: int=1 << 20, stat: meter=None):
+    '''write recorded image in offset order, zeros between and inside zero extents'''
+
+    zero = zeros(chunk)
+    stat = stat or meter(size)
+    position = 0
+
+    for start, end, data in image.extents + [(size, size, b'')]:
+        if data is None:
+            continue
+        while position < start:
+            lenght = min(chunk, start - position)
+            out.write(zero[:lenght])
+            position += lenght
+            stat.update(lenght)
+        if isinstance(data, bytes):
+            out.write(data)
+            stat.update(len(data))
+        else:
+            for p in range(start, end, chunk):
+                block = data.chunk(p, min(chunk, end - p))
+                out.write(block)
+                stat.update(len(block))
+        position = end
+
+
+def image(fs: str, size: int, volume_label: str='', partition: bool=True, full: bool=False,
+          pattern: bytes=b'\x00', progress: Callable=None, cancel: object=None, prealloc: dict=None) -> (journal, str):
+    '''format image in memory only, partition adds MBR and puts volume at sector 1'''
+
+    stream = journal(None, size)
+    offset = 0
+
+    if partition:
+        stream.write(mbr(size, fs))
+        offset = 512
+
+    info = fat(stream, fs, size - offset, offset, volume_label, full=full, pattern=pattern, progress=progress, cancel=cancel,
+               prealloc=prealloc)
+
+    return stream, info
+
+
+def export(out, fs: str, size: int, volume_label: str='', partition: bool=True, full: bool=False,
+           pattern: bytes=b'\x00', chunk: int=1 << 22, progress: Callable=None, cancel: object=None,
+           prealloc: dict=None) -> str:
+    '''format image in memory, then write it to out strictly sequentially: out needs only write(),
+    a pipe, socket file or compressor works'''
+
+    stream, info = image(fs, size, volume_label, partition, full, pattern, progress, cancel, prealloc)
+
+    emit(out, stream, size, chunk, meter(size, 'Export', progress, cancel))
+
+    if hasattr(out, 'flush'):
+        out.flush()
+
+    return info
+
+
+def create(path: str, fs: str, size: int, volume_label: str='', partition: bool=True, block: int=1 << 16,
+           progress: Callable=None, cancel: object=None, prealloc: dict=None) -> str:
+    '''format image in memory and store it as .afi container, zeros are not written'''
+
+    stream, info = image(fs, size, volume_label, partition, progress=progress, cancel=cancel, prealloc=prealloc)
+
+    save(path, journal_blocks(stream, block), size, block, progress=progress, cancel=cancel)
+
+    return info
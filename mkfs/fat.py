@@ -1,13 +1,21 @@
 from struct import pack_into
+from typing import Callable
 
 from .base import nodos_asm_5Ah
 from .boot import boot_fat16, boot_fat32, fat32_fsinfo
 from .dostime import GetDosDateTime
-from .error import mkfs_error
+from .error import mkfs_error, verify_error
 from .exfat import exfat
+from .exfs import FAT
+from .fill import fill
 from .fopen import fopen
 from .info import fs_info
+from .inject import fits, prealloc as preallocate
+from .journal import journal
 from .label import *
+from .readback import readback
+from .reader import view
+from .surface import bad_clusters, surface
 
 
 def calc_size(clusters: int, sector: int, cluster_size: int, fat_copies: int, reserved_size: int, fs: str) -> (int, int):
@@ -28,8 +36,11 @@ def calc_size(clusters: int, sector: int, cluster_size: int, fat_copies: int, re
     return fat_size, required_size
 
 
-def fat(stream: fopen, fs: str, size: int, offset: int=0, volume_label: str='') -> str:
-    '''Make FAT12/FAT16/FAT32 File System'''
+def fat(stream: fopen, fs: str, size: int, offset: int=0, volume_label: str='', verify: bool=False,
+        full: bool=False, pattern: bytes=b'\x00', scan: bool=False, progress: Callable=None, cancel: object=None,
+        prealloc: dict=None) -> str:
+    '''Make FAT12/FAT16/FAT32 File System
+    prealloc - {count, size, directory, name} of contiguous files created right after format (FAT32)'''
     
     sector = 512
     sectors = size // sector
@@ -41,7 +52,10 @@ def fat(stream: fopen, fs: str, size: int, offset: int=0, volume_label: str='')
     
     if fs == 'exFAT':
         del sector, sectors, signature
-        return exfat(stream, size, offset, volume_label)
+        return exfat(stream, size, offset, volume_label, verify, full, pattern, scan, progress, cancel, prealloc)
+
+    if prealloc and fs != 'FAT32':
+        raise mkfs_error('Preallocated files need FAT32 or exFAT')
 
     if fs == 'FAT12':
         reserved_size = 1 * sector
@@ -97,6 +111,9 @@ def fat(stream: fopen, fs: str, size: int, offset: int=0, volume_label: str='')
         minsize_32768 = maxsize_16384
         maxsize_32768 = 2199023255552
     
+    if verify:
+        stream = journal(stream)
+
     fat_copies = 2
     reserved_size += root_entries * 32
     
@@ -151,6 +168,10 @@ def fat(stream: fopen, fs: str, size: int, offset: int=0, volume_label: str='')
     else:
         fsinfo = allowed[65536]
 
+    if prealloc:
+        # свежий том свободен одним участком за корневым каталогом, непригодный запрос отклоняется до записи
+        fits([fsinfo['clusters'] - 1], fsinfo['cluster_size'], False, **prealloc)
+
     if fs in ('FAT12', 'FAT16'):
         boot = boot_fat16()
         boot.wMaxRootEntries = fsinfo['root_entries']
@@ -224,6 +245,19 @@ def fat(stream: fopen, fs: str, size: int, offset: int=0, volume_label: str='')
     boot.sFSType = b'%-8s' % fs.encode('cp866')
     boot.wBootSignature = signature
 
+    boot.pack()
+
+    speed = 0.0
+
+    if full:
+        speed = fill(stream, boot.dataoffs + offset, size - boot.dataoffs, pattern, region='Full format', progress=progress, cancel=cancel).speed
+
+    if scan:
+        bad = surface(stream, boot.dataoffs + offset, size - boot.dataoffs, pattern if full else None, progress=progress, cancel=cancel)
+        bad = bad_clusters(bad, boot.dataoffs + offset, boot.cluster, fsinfo['clusters'] + 1)
+        if fs == 'FAT32' and boot.dwRootCluster in bad:
+            raise mkfs_error('Root directory cluster is bad')
+
     stream.seek(offset)
     stream.write(boot.pack())
 
@@ -232,8 +266,7 @@ def fat(stream: fopen, fs: str, size: int, offset: int=0, volume_label: str='')
         
         root = bytearray(boot.cluster)
 
-    stream.seek(boot.fat() + offset)
-    stream.write(bytes(boot.wBytesPerSector * boot.wSectorsPerFAT * 2))
+    fill(stream, boot.fat() + offset, boot.fat(fat_copies) - boot.fat(), region='FAT', progress=progress, cancel=cancel)
 
     clus = clus_0_2 + bytes(512 - len(clus_0_2))
     
@@ -251,11 +284,41 @@ def fat(stream: fopen, fs: str, size: int, offset: int=0, volume_label: str='')
     
     stream.write(bytes(root))
 
+    bad_count = None
+
+    if scan:
+        table = FAT(stream, boot.fat() + offset, fsinfo['clusters'], {'FAT12': 12, 'FAT16': 16, 'FAT32': 32}[fs], mapfree=False)
+        table.offset2 = boot.fat(1) + offset
+
+        for start, count in bad.items():
+            table.mark_run(start, count, bad=True)
+
+        bad_count = sum(bad.values())
+
+        if fs == 'FAT32' and bad_count:
+            fsi.dwFreeClusters -= bad_count
+            stream.seek(offset + sector)
+            stream.write(fsi.pack())
+
     stream.flush()
 
+    if prealloc:
+        reserved = preallocate(view(stream, offset), progress=progress, cancel=cancel, **prealloc)
+
+    if verify:
+        lba = readback(stream, progress=progress, cancel=cancel)
+        if lba:
+            raise verify_error(lba)
+
     free_clusters = fsinfo['clusters']
 
     if fs == 'FAT32':
         free_clusters -= 1
 
-    return fs_info(fs, volume_label, boot.dwVolumeID, free_clusters, boot.cluster, fsinfo)
+    if bad_count:
+        free_clusters -= bad_count
+
+    if prealloc:
+        free_clusters = reserved['free_clusters']
+
+    return fs_info(fs, volume_label, boot.dwVolumeID, free_clusters, boot.cluster, fsinfo, speed, bad_count)
@@ -0,0 +1,28 @@
+from typing import List
+
+
+def unpack12(data: bytes) -> List[int]:
+    '''decode FAT12 page, each 3 bytes hold 2 entries'''
+
+    data = bytes(data[:len(data) // 3 * 3])
+    out = [0] * (len(data) // 3 * 2)
+
+    b1 = data[1::3]
+    out[0::2] = [b0 | (b & 0x0F) << 8 for b0, b in zip(data[0::3], b1)]
+    out[1::2] = [b >> 4 | b2 << 4 for b, b2 in zip(b1, data[2::3])]
+
+    return out
+
+
+def pack12(entries: List[int]) -> bytes:
+    '''encode even number of FAT12 entries, 2 entries in 3 bytes'''
+
+    out = bytearray(len(entries) // 2 * 3)
+
+    even = entries[0::2]
+    odd = entries[1::2]
+    out[0::3] = bytes(e & 0xFF for e in even)
+    out[1::3] = bytes(e >> 8 | (o & 0x0F) << 4 for e, o in zip(even, odd))
+    out[2::3] = bytes(o >> 4 for o in odd)
+
+    return bytes(out)
@@ -0,0 +1,129 @@
+from queue import Queue
+from threading import Event, Thread
+from time import perf_counter
+from typing import Callable
+
+from .journal import journal
+from .meter import meter
+
+
+class pattern(object):
+    # повторяющийся шаблон заполнения, привязанный к абсолютному смещению
+
+    def __init__(self, fill: bytes=b'\x00'):
+        self.fill = bytes(fill or b'\x00')
+        self.zero = self.fill.count(0) == len(self.fill)
+        self.cache = {}
+
+    def chunk(self, position: int, lenght: int) -> bytes:
+        '''pattern bytes for region [position, position + lenght)'''
+
+        key = (position % len(self.fill), lenght)
+        buffer = self.cache.get(key)
+
+        if buffer is None:
+            if self.zero:
+                buffer = bytes(lenght)
+            else:
+                phase = key[0]
+                count = (phase + lenght + len(self.fill) - 1) // len(self.fill)
+                buffer = (self.fill * count)[phase:phase + lenght]
+            if len(self.cache) > 4:
+                self.cache.clear()
+            self.cache[key] = buffer
+
+        return buffer
+
+
+class tuner(object):
+    # подбор размера блока записи по максимальной скорости
+
+    def __init__(self, size: int=1 << 20, limit: int=1 << 26, samples: int=4):
+        self.size = size
+        self.limit = limit
+        self.samples = samples
+        self.best = (size, 0.0)
+        self.count = 0
+        self.lenght = 0
+        self.elapsed = 0.0
+        self.done = False
+
+    def update(self, lenght: int, elapsed: float):
+        if self.done or lenght != self.size:
+            return
+
+        self.count += 1
+        self.lenght += lenght
+        self.elapsed += elapsed
+
+        if self.count < self.samples:
+            return
+
+        speed = self.lenght / max(self.elapsed, 1e-9)
+
+        if speed > self.best[1] * 1.05:
+            self.best = (self.size, speed)
+            if self.size < self.limit:
+                self.size *= 2
+            else:
+                self.done = True
+        else:
+            self.size = self.best[0]
+            self.done = True
+
+        self.count = 0
+        self.lenght = 0
+        self.elapsed = 0.0
+
+
+def produce(queue: Queue, source: pattern, position: int, end: int, size: tuner, abort: Event):
+    '''generate pattern buffers ahead of the writer'''
+
+    while position < end and not abort.is_set():
+        lenght = min(size.size, end - position)
+        queue.put(source.chunk(position, lenght))
+        position += lenght
+
+    queue.put(None)
+
+
+def fill(stream, position: int, lenght: int, value: bytes=b'\x00', chunk: int=0, depth: int=3,
+         region: str='Fill', progress: Callable=None, cancel: object=None) -> meter:
+    '''overwrite region with pattern, buffers generated on background thread'''
+
+    source = pattern(value)
+    stat = meter(lenght, region, progress, cancel)
+
+    if isinstance(stream, journal):
+        stream.expect(position, position + lenght, None if source.zero else source)
+        stream = stream.stream
+
+    if not lenght or stream is None:
+        return stat
+
+    size = tuner(chunk, chunk) if chunk else tuner()
+    queue = Queue(maxsize=depth)
+    abort = Event()
+
+    producer = Thread(target=produce, args=(queue, source, position, position + lenght, size, abort), daemon=True)
+    producer.start()
+
+    try:
+        stream.seek(position)
+
+        while True:
+            buffer = queue.get()
+            if buffer is None:
+                break
+            start = perf_counter()
+            stream.write(buffer)
+            size.update(len(buffer), perf_counter() - start)
+            stat.update(len(buffer))
+    finally:
+        abort.set()
+        while producer.is_alive():
+            while not queue.empty():
+                queue.get()
+            producer.join(0.01)
+
+    return stat
@@ -1,9 +1,17 @@
-import io, pywintypes, struct, win32file, winioctlcon, wmi
+import io, struct
+
+from .afi import afi
+
+try:
+    import pywintypes, win32file, winioctlcon, wmi
+except ImportError:
+    # pywin32 есть только в Windows, образы и io.BytesIO работают и без него
+    pywintypes = win32file = winioctlcon = wmi = None
 
 class fopen(object):
     # класс для работы с блочными устройствами и io.BytesIO() как с файлом
     
-    def __init__(self, filename, mode="r+b", letters=[]):
+    def __init__(self, filename, mode="r+b", letters=None):
         self.filename = filename
         self.bs = 512
         self.buffer = b''
@@ -11,7 +19,7 @@ class fopen(object):
         self.mode = mode
         self.filesize = False
         self.handle = False
-        self.letters = letters
+        self.letters = [] if letters is None else letters
         if self.mode == "rb":
             self.write_enabled = False
         elif self.mode in ["r+b", "rb+", "wb"]:
@@ -26,6 +34,9 @@ class fopen(object):
         elif type(self.filename) is io.BytesIO:
             self.type = "BYTESIO"
             self.handle = self.filename
+        elif self.filename.endswith(".afi"):
+            self.type = "AFI"
+            self.handle = afi(self.filename, self.mode)
         else:
             self.type = "FILE"
             self.handle = open(self.filename, self.mode)
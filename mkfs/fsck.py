@@ -0,0 +1,246 @@
+from struct import unpack_from
+from typing import Callable, List, Tuple
+
+from .boot import boot_exfat, fat32_fsinfo
+from .clustermap import BITS, bad, both, breaks, entries, mask
+from .meter import meter
+from .reader import directory, gather, volume
+
+
+def first(data: bytes, limit: int=8) -> List[int]:
+    '''indices of first set bytes of mask'''
+
+    out = []
+    i = data.find(1)
+
+    while i >= 0 and len(out) < limit:
+        out.append(i)
+        i = data.find(1, i + 1)
+
+    return out
+
+
+class fsck(object):
+    # проверка тома FAT32/exFAT: FAT и битовая карта читаются целиком, связи кластеров
+    # сравниваются с тождественной цепочкой i -> i + 1 через xor больших чисел, так что
+    # непрерывный участок цепочки находится одним find по маске разрывов, а не чтением каждой записи
+    # owned - байт на кластер, занятый файлами и каталогами, найденными обходом дерева
+
+    def __init__(self, stream, progress: Callable=None, cancel: object=None):
+        self.boot, self.table = volume(stream, mapfree=False)
+        self.stream = self.boot.stream
+        self.exfat = bool(self.table.exfat)
+        self.cluster = self.boot.cluster
+        self.clusters = self.table.size
+        self.stat = meter(0, 'Check', progress, cancel)
+        self.errors = []
+        self.warnings = []
+        self.runs = []
+        self.files = 0
+        self.directories = 0
+
+    def error(self, text: str):
+        self.errors.append(text)
+
+    def warning(self, text: str):
+        '''hint fields (FSInfo, PercentInUse) any system recalculates'''
+
+        self.warnings.append(text)
+
+    def load(self):
+        '''FAT as array, mask of breaks of identity chain, allocation mask'''
+
+        n = self.clusters + 2
+        self.stream.seek(self.boot.fatoffs if self.exfat else self.boot.fat())
+        data = self.stream.read(4 * n)
+        self.stat.update(len(data))
+
+        self.fat = entries(data)
+        self.breaks = breaks(data, self.exfat)
+
+        self.bad = self.table.bad
+        self.last = self.table.last if self.exfat else 0x0FFFFFF8
+        self.owned = bytearray(n)
+        self.ones = b'\x01' * n
+
+        # плохие кластеры заняты, но не принадлежат ни одному файлу
+        self.marked = bad(data, self.exfat)
+
+        if not self.exfat:
+            self.allocated = b'\x00\x00' + mask(data, True)[2:]
+            self.stream.seek(self.boot.fat(1))
+            if self.stream.read(len(data))[8:] != data[8:]:
+                self.error('FAT copies differ')
+
+    def chain(self, name: str, start: int, size: int=0, contig: bool=False) -> List[Tuple[int, int]]:
+        '''runs of file, contiguous exFAT file without FAT, otherwise FAT chain followed run by run'''
+
+        if not start:
+            if size:
+                self.error(f'{name}: {size} bytes without clusters')
+            return []
+
+        if not 2 <= start <= self.clusters + 1:
+            self.error(f'{name}: first cluster {start:#x} outside volume')
+            return []
+
+        if contig:
+            count = max(1, (size + self.cluster - 1) // self.cluster)
+            if start + count > self.clusters + 2:
+                self.error(f'{name}: contiguous run past end of volume')
+                count = self.clusters + 2 - start
+            return [(start, count)]
+
+        runs = []
+        total = 0
+        cluster = start
+
+        while True:
+            end = self.breaks.find(1, cluster)
+            end = self.clusters + 1 if end < 0 else end
+            runs.append((cluster, end - cluster + 1))
+            total += end - cluster + 1
+            following = self.fat[end] & (0xFFFFFFFF if self.exfat else 0x0FFFFFFF)
+            if following >= self.last:
+                break
+            if total > self.clusters:
+                self.error(f'{name}: chain loops')
+                break
+            if following == self.bad:
+                self.error(f'{name}: bad cluster {end:#x} in chain')
+                break
+            if not following:
+                self.error(f'{name}: chain ends with free cluster {end:#x}')
+                break
+            if not 2 <= following <= self.clusters + 1:
+                self.error(f'{name}: cluster {end:#x} points outside volume')
+                break
+            cluster = following
+
+        return runs
+
+    def own(self, name: str, runs: List[Tuple[int, int]]):
+        '''mark clusters of name, report clusters already taken by another chain'''
+
+        for start, count in runs:
+            taken = count - self.owned[start:start + count].count(0)
+            if taken:
+                owners = sorted(set(owner for owner, a, k in self.runs if a < start + count and start < a + k))
+                self.error(f"{name}: {taken} clusters cross-linked with {', '.join(owners) or name}")
+            self.owned[start:start + count] = self.ones[:count]
+            self.runs.append((name, start, count))
+
+    def read(self, runs: List[Tuple[int, int]], size: int=0) -> bytes:
+        data = gather(self.boot, runs)
+        self.stat.update(len(data))
+
+        return data[:size] if size else data
+
+    def walk(self, path: str, runs: List[Tuple[int, int]], visited: set):
+        '''check every entry of directory tree'''
+
+        d = directory(None, self.cluster, self.exfat)
+        data = self.read(runs)
+
+        if self.exfat:
+            d.parse_exfat(data)
+        else:
+            d.parse_fat(data)
+
+        d.done = True
+        self.directories += 1
+
+        for found in d:
+            name = path.rstrip('/') + '/' + found.name
+            contig = found.contig and self.exfat
+            runs = self.chain(name, found.cluster, found.size, contig)
+            self.own(name, runs)
+            if found.dir:
+                if found.cluster in visited:
+                    self.error(f'{name}: directory loop')
+                    continue
+                visited.add(found.cluster)
+                self.walk(name, runs, visited)
+                continue
+            self.files += 1
+            need = (found.size + self.cluster - 1) // self.cluster
+            have = sum(count for start, count in runs)
+            if have < need or (not contig and have != need):
+                self.error(f'{name}: {found.size} bytes in {have} clusters')
+
+    def system(self):
+        '''clusters of exFAT bitmap and upcase table, allocation mask from bitmap, VBR and upcase checksums'''
+
+        # основной и резервный VBR по 12 секторов, размер сектора от 512 байт до 4 КБ
+        sector = 1 << self.boot.uchBytesPerSector
+        self.stream.seek(0)
+        vbr = self.stream.read(24 * sector)
+
+        for backup in (0, 1):
+            part = vbr[backup * 12 * sector:(backup + 1) * 12 * sector]
+            total = boot_exfat.GetChecksum(part[:11 * sector])
+            if any(value != total for value in unpack_from(f'<{sector // 4}I', part, 11 * sector)):
+                self.error(f"{('main', 'backup')[backup]} VBR checksum mismatch")
+
+        root = self.read(self.chain('/', self.boot.dwRootCluster))
+
+        for i in range(0, len(root), 32):
+            if root[i] not in (0x81, 0x82):
+                continue
+            start, lenght = unpack_from('<IQ', root, i + 0x14)
+            name = ('$Bitmap', '$UpCase')[root[i] - 0x81]
+            contig = not self.fat[start] if 2 <= start <= self.clusters + 1 else False
+            runs = self.chain(name, start, lenght, contig)
+            self.own(name, runs)
+            if root[i] == 0x81:
+                bitmap = self.read(runs, lenght)
+                self.allocated = (b'\x00\x00' + b''.join(map(BITS.__getitem__, bitmap)))[:self.clusters + 2]
+            if root[i] == 0x82 and boot_exfat.GetChecksum(self.read(runs, lenght), True) != unpack_from('<I', root, i + 4)[0]:
+                self.error('$UpCase: table checksum mismatch')
+
+    def check(self) -> dict:
+        '''run all checks, report errors and counters'''
+
+        self.load()
+
+        if self.exfat:
+            self.allocated = None
+            self.system()
+            if self.allocated is None:
+                self.error('Allocation Bitmap not found')
+                self.allocated = bytes(self.clusters + 2)
+
+        root = self.chain('/', self.boot.dwRootCluster)
+        self.own('/', root)
+
+        self.walk('/', root, {self.boot.dwRootCluster})
+
+        owned = bytes(self.owned)
+        used = self.allocated.count(1)
+        lost = both(both(self.allocated, owned, True), self.marked, True)
+        lost_count = lost.count(1)
+        if lost_count:
+            self.error(f'{lost_count} lost clusters, first at {", ".join(hex(i) for i in first(lost))}')
+
+        missing = both(owned, self.allocated, True)
+        missing_count = missing.count(1)
+        if missing_count:
+            where = 'bitmap' if self.exfat else 'FAT'
+            self.error(f'{missing_count} clusters in use but free in {where}, first at {", ".join(hex(i) for i in first(missing))}')
+
+        free = self.clusters - used
+
+        if self.exfat:
+            percent = self.boot.uchPercentInUse
+            if percent != 0xFF and percent != 100 * used // self.clusters:
+                self.warning(f'PercentInUse {percent} instead of {100 * used // self.clusters}')
+        else:
+            position = self.boot.wFSISector * self.boot.wBytesPerSector
+            self.stream.seek(position)
+            fsi = fat32_fsinfo(bytearray(self.stream.read(512)), position)
+            if fsi.dwFreeClusters != 0xFFFFFFFF and fsi.dwFreeClusters != free:
+                self.warning(f'FSInfo free clusters {fsi.dwFreeClusters} instead of {free}')
+
+        return {'fs': 'exFAT' if self.exfat else 'FAT32', 'clusters': self.clusters, 'used': used, 'free': free,
+                'files': self.files, 'directories': self.directories, 'lost': lost_count, 'missing': missing_count,
+                'errors': self.errors, 'warnings': self.warnings, 'ok': not self.errors}
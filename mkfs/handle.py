@@ -1,5 +1,9 @@
 from typing import List
-import win32file, winioctlcon
+
+try:
+    import win32file, winioctlcon
+except ImportError:
+    win32file = winioctlcon = None
 
 
 def handle(letter: str) -> object:
@@ -12,4 +16,7 @@ def handle(letter: str) -> object:
 def handle_list(letters: List[str]) -> List[object]:
     '''return list PyHANDLE objects'''
     
+    if win32file is None:
+        return []
+    
     return [handle(letter) for letter in letters]
@@ -9,7 +9,7 @@ def sizes(size: int) -> (int, str):
             return factor, item
 
 
-def fs_info(fs: str, volume_label: str, volume_id: int, free_clusters: int, boot_cluster: int, fsinfo: dict) -> str:
+def fs_info(fs: str, volume_label: str, volume_id: int, free_clusters: int, boot_cluster: int, fsinfo: dict, speed: float=0.0, bad: int=None) -> str:
     '''partition info'''
     
     clusters = fsinfo['clusters']
@@ -17,11 +17,19 @@ def fs_info(fs: str, volume_label: str, volume_id: int, free_clusters: int, boot
     required_size = fsinfo['required_size']
 
     factor, item = sizes(required_size)
-    
-    return f'File System:    {fs}\n'\
+
+    info = f'File System:    {fs}\n'\
            f'Volume ID:      {"-".join(pack("<I", volume_id).hex()[i*4:(i+1)*4] for i in range(2))}\n'\
            f'Volume Label:   {volume_label}\n'\
            f'Total Clusters: {clusters}\n'\
            f'Cluster Size:   {cluster_size / 1024 :.01f} KB\n'\
            f'Free Space:     {(free_clusters * boot_cluster) / (1 << factor) :.02f} {item}\n'\
            f'Partition Size: {required_size / (1 << factor) :.02f} {item}'
+
+    if speed:
+        info += f'\nWrite Speed:    {speed :.02f} MB/s'
+
+    if bad is not None:
+        info += f'\nBad Clusters:   {bad}'
+
+    return info
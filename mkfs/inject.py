@@ -0,0 +1,312 @@
+import os
+from collections import OrderedDict
+from struct import pack
+from typing import Callable, Dict, List, NamedTuple, Tuple, Union
+
+from .dostime import GetDosDateTime
+from .entryset import entryset
+from .error import FATException, mkfs_error
+from .exfs import Chain
+from .meter import meter
+from .pipeline import pipeline
+from .reader import checksum, volume
+from .usage import store
+
+
+# символы, допустимые в имени 8.3 кроме букв и цифр
+SHORT_CHARS = set(b"ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789!#$%&'()-@^_`{}~")
+
+
+class reserved(NamedTuple):
+    # источник без содержимого: кластеры файла размещаются, данные не копируются,
+    # в exFAT ValidDataLength остается нулевым, так что файл читается нулями
+    lenght: int
+
+
+def local(path: str) -> dict:
+    '''tree of local directory {name: file path or subtree}'''
+
+    return {entry.name: local(entry.path) if entry.is_dir() else entry.path
+            for entry in sorted(os.scandir(path), key=lambda entry: entry.name)}
+
+
+def lenght(source: Union[bytes, str, reserved]) -> int:
+    if isinstance(source, reserved):
+        return source.lenght
+
+    return len(source) if isinstance(source, (bytes, bytearray)) else os.path.getsize(source)
+
+
+def alias(name: str, taken: dict) -> (bytes, bool):
+    '''unique 8.3 name and whether long name slots are needed,
+    taken holds names of directory and next ~N tail of every stem'''
+
+    base, dot, ext = name.upper().rpartition('.')
+
+    if not dot:
+        base, ext = name.upper(), ''
+
+    raw = base.encode('ascii', 'replace'), ext.encode('ascii', 'replace')
+    plain = (name == name.upper() and 0 < len(raw[0]) <= 8 and len(raw[1]) <= 3 and '.' not in base
+             and all(c in SHORT_CHARS for c in raw[0] + raw[1]))
+    short = b'%-8s%-3s' % raw if plain else None
+
+    if short and short not in taken:
+        taken[short] = None
+        return short, False
+
+    clean = [bytes(c if c in SHORT_CHARS else ord('_') for c in part.replace(b' ', b'').replace(b'.', b''))
+             for part in raw]
+    stem = (clean[0][:6] or b'_', clean[1][:3])
+    number = taken.get(stem, 1)
+
+    while True:
+        tail = b'~%d' % number
+        short = b'%-8s%-3s' % (stem[0][:8 - len(tail)] + tail, stem[1])
+        number += 1
+        if short not in taken:
+            taken[short] = None
+            taken[stem] = number
+            return short, True
+
+
+def fat_slots(name: str, short: bytes, long: bool, attributes: int, cluster: int, size: int, stamp: int) -> bytes:
+    '''FAT32 entry with long name slots in front of it'''
+
+    entry = pack('<11sBBBHHHHHHHI', short, attributes, 0, 0, stamp & 0xFFFF, stamp >> 16, stamp >> 16,
+                 cluster >> 16, stamp & 0xFFFF, stamp >> 16, cluster & 0xFFFF, size)
+
+    if not long:
+        return entry
+
+    text = name.encode('utf_16_le') + b'\x00\x00'
+    text += b'\xFF' * (-len(text) % 26)
+    parts = [text[i:i + 26] for i in range(0, len(text), 26)]
+    total = checksum(short)
+    slots = []
+
+    for order in range(len(parts), 0, -1):
+        part = parts[order - 1]
+        slots.append(pack('<B10sBBB12sH4s', order | (0x40 if order == len(parts) else 0), part[:10], 0x0F, 0, total,
+                          part[10:22], 0, part[22:]))
+
+    return b''.join(slots) + entry
+
+
+def slots(name: str) -> int:
+    '''FAT32 directory bytes taken by entry of name with long name slots'''
+
+    return 32 * (2 + (len(name) + 12) // 13)
+
+
+def planned(name: str, source, parent: dict=None) -> dict:
+    return {'name': name, 'source': source, 'parent': parent, 'children': [], 'runs': OrderedDict(),
+            'size': 0 if isinstance(source, dict) else lenght(source)}
+
+
+def walk(tree: dict, root: dict) -> List[dict]:
+    '''all nodes breadth first, directories before files of the same level'''
+
+    nodes = []
+    queue = [(tree, root)]
+
+    while queue:
+        source, node = queue.pop(0)
+        for name, child in source.items():
+            item = planned(name, child, node)
+            node['children'].append(item)
+            nodes.append(item)
+            if isinstance(child, dict):
+                queue.append((child, item))
+
+    return nodes
+
+
+def extents(boot, runs: OrderedDict) -> List[Tuple[int, int]]:
+    '''(position, lenght) of every run of clusters'''
+
+    return [(boot.cl2offset(start), count * boot.cluster) for start, count in runs.items()]
+
+
+def inject(stream, tree: Dict[str, Union[bytes, str, reserved, dict]], chunk: int=1 << 22, readers: int=2,
+           writers: int=4, depth: int=16, contiguous: bool=False, progress: Callable=None, cancel: object=None) -> dict:
+    '''copy tree {name: bytes, file path, reserved or subtree} into freshly formatted FAT32/exFAT volume:
+    whole tree is allocated first, one run per file where free space allows (required with contiguous),
+    file data is copied by pipeline of readers and positional writers in ascending cluster order,
+    directories and FSInfo are written afterwards by this thread only'''
+
+    boot, table = volume(stream)
+    exfat = bool(table.exfat)
+    allocator = boot.bitmap if exfat else table
+    stamp = GetDosDateTime()
+
+    root = planned('', {})
+    nodes = walk(tree, root)
+    directories = [node for node in nodes if isinstance(node['source'], dict)]
+    files = [node for node in nodes if not isinstance(node['source'], dict)]
+
+    def attributes(node: dict) -> int:
+        return 0x10 if isinstance(node['source'], dict) else 0x20
+
+    def used(node: dict) -> int:
+        '''directory bytes of node entries, exFAT names are checked here before anything is allocated'''
+
+        if not exfat:
+            upper = set(child['name'].upper() for child in node['children'])
+            if len(upper) < len(node['children']):
+                raise FATException(f"{node['name'] or '/'}: duplicate names in directory")
+            return sum(slots(child['name']) for child in node['children']) + (0 if node is root else 64)
+        node['entries'] = entryset(boot.cluster)
+        for child in node['children']:
+            node['entries'].add(child['name'], attributes(child))
+        return node['entries'].lenght
+
+    rootchain = Chain(boot, table, boot.dwRootCluster)
+    data = bytes(rootchain.read())
+    end = next((i for i in range(0, len(data), 32) if not data[i]), len(data))
+    need = end + used(root)
+
+    # все имена проверяются и размеры каталогов считаются до первого размещения
+    for node in directories:
+        node['size'] = max(1, (used(node) + boot.cluster - 1) // boot.cluster) * boot.cluster
+
+    grow = max(0, (need - rootchain.size + boot.cluster - 1) // boot.cluster)
+    clusters = grow + sum((node['size'] + boot.cluster - 1) // boot.cluster for node in directories + files)
+
+    if clusters > allocator.free_clusters:
+        raise FATException(f'{clusters} clusters needed, only {allocator.free_clusters} free')
+
+    if not rootchain.runs:
+        rootchain._get_frags()
+
+    taken = sum(rootchain.runs.values())
+    last = list(rootchain.runs.items())[-1]
+    last = last[0] + last[1] - 1
+
+    try:
+        if grow:
+            rootchain._alloc(grow)
+            if exfat:
+                # корневой каталог exFAT всегда описан цепочкой FAT, даже непрерывный
+                runs = list(rootchain.runs.items())
+                for start, count in runs:
+                    table.mark_run(start, count)
+                for (start, count), (following, _) in zip(runs, runs[1:]):
+                    table[start + count - 1] = following
+
+        for node in directories:
+            allocator.alloc(node['runs'], node['size'] // boot.cluster)
+
+        for node in files:
+            if node['size']:
+                allocator.alloc(node['runs'], (node['size'] + boot.cluster - 1) // boot.cluster)
+                if contiguous and len(node['runs']) > 1:
+                    raise FATException(f"{node['name']}: no contiguous run of {node['size']} bytes left")
+    except FATException:
+        # размещенное возвращается, том остается без потерянных кластеров
+        for node in directories + files:
+            if node['runs']:
+                allocator.free(next(iter(node['runs'])), node['runs'])
+        added = OrderedDict()
+        skip = taken
+        for start, count in rootchain.runs.items():
+            if skip < count:
+                added[start + skip] = count - skip
+            skip = max(0, skip - count)
+        if added:
+            allocator.free(next(iter(added)), added)
+            table[last] = table.last
+        raise
+
+    def start(node: dict) -> int:
+        return next(iter(node['runs'])) if node['runs'] else 0
+
+    def entries(node: dict, extra: int=0) -> bytes:
+        if exfat:
+            for index, child in enumerate(node['children']):
+                node['entries'].place(index, start(child), child['size'], len(child['runs']) == 1,
+                                      0 if isinstance(child['source'], reserved) else None)
+            return bytes(node['entries'].pack(extra))
+        taken = {}
+        out = []
+        for child in node['children']:
+            short, long = alias(child['name'], taken)
+            out.append(fat_slots(child['name'], short, long, attributes(child), start(child),
+                                 0 if attributes(child) == 0x10 else child['size'], stamp))
+        return b''.join(out)
+
+    copied = [node for node in files if not isinstance(node['source'], reserved)]
+    total = sum(node['size'] for node in directories + copied) + need - end
+    stat = meter(total, 'Inject', progress, cancel)
+
+    copy = pipeline(boot.stream, readers, writers, depth, chunk, stat)
+    copy.run([(node['source'], extents(boot, node['runs'])) for node in sorted(copied, key=start) if node['size']])
+
+    for node in directories:
+        data = b''
+        if not exfat:
+            parent = start(node['parent']) if node['parent'] is not root else 0
+            data = (fat_slots('.', b'.          ', False, 0x10, start(node), 0, stamp) +
+                    fat_slots('..', b'..         ', False, 0x10, parent, 0, stamp))
+        data += entries(node)
+        data += bytes(node['size'] - len(data))
+        for position, lenght in extents(boot, node['runs']):
+            boot.stream.seek(position)
+            boot.stream.write(data[:lenght])
+            data = data[lenght:]
+        stat.update(node['size'])
+
+    rootchain.seek(end)
+    data = entries(root, end)
+    rootchain.write(data + bytes(rootchain.size - end - len(data)))
+    stat.update(rootchain.size - end)
+
+    store(boot, allocator.free_clusters, None if exfat else table.last_free_alloc + 1)
+
+    boot.stream.flush()
+
+    return {'files': len(files), 'directories': len(directories), 'bytes': sum(node['size'] for node in copied),
+            'reserved': len(files) - len(copied), 'fragmented': sum(1 for node in nodes if len(node['runs']) > 1),
+            'free_clusters': allocator.free_clusters}
+
+
+def parts(directory: str) -> List[str]:
+    return [part for part in directory.replace('\\', '/').split('/') if part]
+
+
+def fits(runs: List[int], cluster: int, exfat: bool, count: int, size: int, directory: str='',
+         name: str='FILE%04d.DAT'):
+    '''raise mkfs_error unless count contiguous files of size bytes and their directories
+    fit into free runs of given lenghts, checked before anything is written'''
+
+    per = (size + cluster - 1) // cluster
+    longest = name % count if count else name
+    entry = 64 + (len(longest) + 14) // 15 * 32 if exfat else slots(longest)
+    clusters = count * per + len(parts(directory)) + (count * entry + 64 + cluster - 1) // cluster
+    free = sum(runs)
+
+    if clusters > free:
+        raise mkfs_error(f'{count} files of {size} bytes need {clusters} clusters, only {free} free')
+
+    if per and sum(lenght // per for lenght in runs) < count:
+        raise mkfs_error(f'{count} contiguous runs of {per} clusters not available, largest free run {max(runs, default=0)}')
+
+
+def prealloc(stream, count: int, size: int, directory: str='', name: str='FILE%04d.DAT', progress: Callable=None,
+             cancel: object=None) -> dict:
+    '''count reserved files of size bytes named name % 1..count in directory ('DCIM/LOOP'),
+    each one contiguous run, for loop recording devices'''
+
+    boot, table = volume(stream)
+    allocator = boot.bitmap if table.exfat else table
+    allocator.map_compact()
+    fits(list(allocator.free_clusters_map.values()), boot.cluster, bool(table.exfat), count, size, directory, name)
+
+    tree = node = {}
+
+    for part in parts(directory):
+        node = node.setdefault(part, {})
+
+    node.update((name % number, reserved(size)) for number in range(1, count + 1))
+
+    return inject(stream, tree, contiguous=True, progress=progress, cancel=cancel)
@@ -0,0 +1,147 @@
+from bisect import bisect_right
+from typing import List, Tuple
+
+
+class journal(object):
+    # обертка над fopen, запоминающая все области, записанные при форматировании
+    # extents: отсортированный список (start, end, data), data=None для нулей,
+    # bytes для записанных данных или шаблон заполнения с методом chunk()
+
+    def __init__(self, stream=None, size=0):
+        self.stream = stream
+        self.size = size
+        self.pos = 0
+        self.mode = getattr(stream, 'mode', 'r+b')
+        self.starts = []
+        self.extents = []
+
+    def record(self, start: int, end: int, data: bytes=None):
+        '''remember region [start, end), overriding older writes'''
+
+        if start >= end:
+            return
+
+        i = bisect_right(self.starts, start)
+
+        if i and self.extents[i - 1][1] > start:
+            i -= 1
+
+        j = i
+        replace = []
+
+        while j < len(self.extents) and self.extents[j][0] < end:
+            s, e, d = self.extents[j]
+            if s < start:
+                replace.append((s, start, cut(d, s, s, start)))
+            replace.append(None)
+            if e > end:
+                replace.append((end, e, cut(d, s, end, e)))
+            j += 1
+
+        if None in replace:
+            replace[replace.index(None)] = (start, end, data)
+            replace = [extent for extent in replace if extent]
+        else:
+            replace = [(start, end, data)]
+
+        if i and replace[0][2] is None and self.extents[i - 1][2] is None and self.extents[i - 1][1] == replace[0][0]:
+            i -= 1
+            replace[0] = (self.extents[i][0], replace[0][1], None)
+
+        self.extents[i:j] = replace
+        self.starts[i:j] = [extent[0] for extent in replace]
+
+    def content(self, start: int, end: int) -> bytes:
+        '''expected bytes of region [start, end)'''
+
+        out = bytearray(end - start)
+
+        i = bisect_right(self.starts, start)
+
+        if i:
+            i -= 1
+
+        while i < len(self.extents) and self.extents[i][0] < end:
+            s, e, d = self.extents[i]
+            if d is not None and e > start:
+                a = max(s, start)
+                b = min(e, end)
+                if isinstance(d, bytes):
+                    out[a - start:b - start] = d[a - s:b - s]
+                else:
+                    out[a - start:b - start] = d.chunk(a, b - a)
+            i += 1
+
+        return bytes(out)
+
+    def expect(self, start: int, end: int, source=None):
+        '''remember region written around the journal by fill()'''
+
+        self.record(start, end, source)
+        self.pos = end
+        self.size = max(self.size, end)
+
+    def written(self) -> List[Tuple[int, int]]:
+        '''list of written regions'''
+
+        return [(s, e) for s, e, d in self.extents]
+
+    def seek(self, position, stop=0):
+        if stop == 1:
+            position += self.pos
+        elif stop == 2:
+            if self.stream is not None:
+                self.pos = self.stream.seek(position, stop)
+                return self.pos
+            position += self.size
+        if self.stream is not None:
+            self.stream.seek(position)
+        self.pos = position
+        return self.pos
+
+    def read(self, lenghts=None):
+        if self.stream is not None:
+            byteOut = self.stream.read(lenghts)
+        else:
+            if lenghts is None:
+                lenghts = max(self.size - self.pos, 0)
+            byteOut = self.content(self.pos, self.pos + lenghts)
+        self.pos += len(byteOut)
+        return byteOut
+
+    def write(self, byteObj):
+        lenght = len(byteObj)
+        if byteObj.count(0) == lenght:
+            self.record(self.pos, self.pos + lenght)
+        else:
+            self.record(self.pos, self.pos + lenght, bytes(byteObj))
+        if self.stream is not None:
+            self.stream.write(byteObj)
+        self.pos += lenght
+        self.size = max(self.size, self.pos)
+        return lenght
+
+    def flush(self):
+        if self.stream is not None:
+            self.stream.flush()
+
+    def tell(self):
+        return self.pos
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+
+def cut(data: bytes, start: int, a: int, b: int) -> bytes:
+    '''slice of extent data starting at start'''
+
+    if not isinstance(data, bytes):
+        return data
+
+    return data[a - start:b - start]
@@ -0,0 +1,42 @@
+from time import perf_counter
+from typing import Callable
+
+from .error import cancel_error
+
+
+class meter(object):
+    # счетчик обработанных байт и скорости по области форматирования
+    # progress(region, done, total, speed) вызывается на каждый блок,
+    # cancel - threading.Event, установка которого прерывает форматирование
+
+    def __init__(self, total: int=0, region: str='', progress: Callable=None, cancel: object=None):
+        self.total = total
+        self.region = region
+        self.progress = progress
+        self.cancel = cancel
+        self.done = 0
+        self.start = perf_counter()
+
+    def update(self, lenght: int):
+        self.done += lenght
+
+        if self.progress is not None:
+            self.progress(self.region, self.done, self.total, self.speed)
+
+        if self.cancel is not None and self.cancel.is_set():
+            raise cancel_error()
+
+    @property
+    def elapsed(self) -> float:
+        return perf_counter() - self.start
+
+    @property
+    def speed(self) -> float:
+        '''MB/s since start'''
+
+        elapsed = self.elapsed
+
+        if not elapsed:
+            return 0.0
+
+        return self.done / elapsed / (1 << 20)
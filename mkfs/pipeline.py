@@ -0,0 +1,150 @@
+import os
+from queue import Queue
+from threading import Event, Lock, Thread
+from typing import Callable, Iterator, List, Tuple, Union
+
+from .meter import meter
+
+
+def blocks(source: Union[bytes, str], chunk: int) -> Iterator[bytes]:
+    '''content of bytes or local file by chunk'''
+
+    if isinstance(source, (bytes, bytearray)):
+        for i in range(0, len(source), chunk):
+            yield source[i:i + chunk]
+        return
+
+    with open(source, 'rb') as f:
+        while True:
+            block = f.read(chunk)
+            if not block:
+                return
+            yield block
+
+
+def positional(stream) -> Callable:
+    '''write(position, block) safe to call from many threads:
+    os.pwrite for plain files, seek and write under lock otherwise'''
+
+    base = 0
+
+    while hasattr(stream, 'offset') and hasattr(stream, 'stream'):
+        base += stream.offset
+        stream = stream.stream
+
+    try:
+        fd = stream.fileno()
+    except (AttributeError, OSError, ValueError):
+        fd = None
+
+    if isinstance(fd, int) and hasattr(os, 'pwrite'):
+        stream.flush()
+
+        def write(position: int, block: bytes):
+            view = memoryview(block)
+            while view:
+                n = os.pwrite(fd, view, base + position)
+                position += n
+                view = view[n:]
+
+        return write
+
+    lock = Lock()
+
+    def write(position: int, block: bytes):
+        with lock:
+            stream.seek(base + position)
+            stream.write(bytes(block))
+
+    return write
+
+
+class pipeline(object):
+    # конвейер копирования файлов в заранее размещенные участки тома:
+    # потоки чтения заранее читают исходные файлы в ограниченную очередь блоков,
+    # потоки записи пишут блоки позиционно, чтение источника и запись на устройство идут одновременно
+    # jobs - список (source, [(position, lenght), ...]), участки в порядке следования данных файла
+
+    def __init__(self, stream, readers: int=2, writers: int=4, depth: int=16, chunk: int=1 << 22, stat: meter=None):
+        self.write = positional(stream)
+        self.readers = max(1, readers)
+        self.writers = max(1, writers)
+        self.queue = Queue(max(1, depth))
+        self.chunk = chunk
+        self.stat = stat
+        self.lock = Lock()
+        self.failed = Event()
+        self.error = None
+
+    def fail(self, error: BaseException):
+        with self.lock:
+            if self.error is None:
+                self.error = error
+        self.failed.set()
+
+    def read(self, jobs: Iterator[Tuple[Union[bytes, str], List[Tuple[int, int]]]]):
+        '''split sources into (position, block) by extents'''
+
+        try:
+            while not self.failed.is_set():
+                with self.lock:
+                    job = next(jobs, None)
+                if job is None:
+                    return
+                source, extents = job
+                extents = iter(extents)
+                position, left = 0, 0
+                for block in blocks(source, self.chunk):
+                    view = memoryview(block)
+                    while view:
+                        if self.failed.is_set():
+                            return
+                        if not left:
+                            position, left = next(extents)
+                        n = min(left, len(view))
+                        self.queue.put((position, view[:n]))
+                        position += n
+                        left -= n
+                        view = view[n:]
+        except BaseException as e:
+            self.fail(e)
+
+    def drain(self):
+        '''write blocks until sentinel, after failure only empty queue so readers never block'''
+
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            if self.failed.is_set():
+                continue
+            position, block = item
+            try:
+                self.write(position, block)
+                if self.stat is not None:
+                    with self.lock:
+                        self.stat.update(len(block))
+            except BaseException as e:
+                self.fail(e)
+
+    def run(self, jobs: List[Tuple[Union[bytes, str], List[Tuple[int, int]]]]):
+        '''copy every job, first error of any thread is raised after all threads stop'''
+
+        jobs = iter(jobs)
+        readers = [Thread(target=self.read, args=(jobs,), daemon=True) for i in range(self.readers)]
+        writers = [Thread(target=self.drain, daemon=True) for i in range(self.writers)]
+
+        for thread in readers + writers:
+            thread.start()
+
+        for thread in readers:
+            thread.join()
+
+        for thread in writers:
+            self.queue.put(None)
+
+        for thread in writers:
+            thread.join()
+
+        if self.error is not None:
+            raise self.error
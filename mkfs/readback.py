@@ -0,0 +1,126 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, List, Tuple
+
+from .journal import journal
+from .meter import meter
+
+
+@lru_cache(maxsize=8)
+def zeros(lenght: int) -> bytes:
+    return bytes(lenght)
+
+
+def compare(position: int, lenght: int, actual: bytes, expected: bytes, bs: int) -> List[Tuple[int, int]]:
+    '''compare one chunk with expected data (zeros for None), return mismatching LBA ranges inside it,
+    expected data is always at hand, so plain comparison is cheaper than hashing both sides'''
+
+    if expected is None:
+        expected = zeros(lenght)
+
+    if actual == expected:
+        return []
+
+    lba = []
+
+    for i in range(0, len(expected), bs):
+        if actual[i:i + bs] != expected[i:i + bs]:
+            sector = (position + i) // bs
+            if lba and lba[-1][1] == sector - 1:
+                lba[-1] = (lba[-1][0], sector)
+            else:
+                lba.append((sector, sector))
+
+    return lba
+
+
+def uncached(device) -> Callable:
+    '''read(position, lenght) from the medium, not from caches: written data is synced and dropped
+    from OS page cache, plain files and block devices are read with os.pread past Python buffers'''
+
+    base = 0
+
+    while hasattr(device, 'offset') and hasattr(device, 'stream'):
+        base += device.offset
+        device = device.stream
+
+    device.flush()
+
+    try:
+        fd = device.fileno()
+    except (AttributeError, OSError, ValueError):
+        fd = None
+
+    if isinstance(fd, int):
+        os.fsync(fd)
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+    if isinstance(fd, int) and hasattr(os, 'pread'):
+        def read(position: int, lenght: int) -> bytes:
+            out = []
+            while lenght:
+                block = os.pread(fd, lenght, base + position)
+                if not block:
+                    break
+                out.append(block)
+                position += len(block)
+                lenght -= len(block)
+            return b''.join(out)
+
+        return read
+
+    def read(position: int, lenght: int) -> bytes:
+        device.seek(base + position)
+        return device.read(lenght)
+
+    return read
+
+
+def chunks(stream: journal, chunk: int):
+    '''split written regions in large sequential reads'''
+
+    for start, end, data in stream.extents:
+        for position in range(start, end, chunk):
+            lenght = min(chunk, end - position)
+            if data is None:
+                yield position, lenght, None
+            elif isinstance(data, bytes):
+                yield position, lenght, data[position - start:position - start + lenght]
+            else:
+                yield position, lenght, data.chunk(position, lenght)
+
+
+def readback(stream: journal, chunk: int=1 << 22, workers: int=4, bs: int=512,
+             progress: Callable=None, cancel: object=None) -> List[Tuple[int, int]]:
+    '''re-read every written region and return mismatching LBA ranges'''
+
+    stream.flush()
+    read = uncached(stream.stream)
+    stat = meter(sum(end - start for start, end in stream.written()), 'Verify', progress, cancel)
+
+    lba = []
+    pending = []
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for position, lenght, expected in chunks(stream, chunk):
+            actual = read(position, lenght)
+            pending.append(pool.submit(compare, position, lenght, actual, expected, bs))
+            stat.update(lenght)
+
+            while len(pending) > workers * 2:
+                lba += pending.pop(0).result()
+
+        for future in pending:
+            lba += future.result()
+
+    merged = []
+
+    for first, last in sorted(lba):
+        if merged and merged[-1][1] >= first - 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+
+    return merged
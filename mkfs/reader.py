@@ -0,0 +1,351 @@
+from collections import OrderedDict
+from struct import unpack_from
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+from .boot import boot_exfat, boot_fat32
+from .error import FATException, exFATException
+from .exfs import FAT, Bitmap, Chain, exFATDirentry
+
+
+class view(object):
+    # окно в потоке, начинающееся с раздела: том разбирается так, будто он лежит с нуля
+
+    def __init__(self, stream, offset: int=0):
+        self.stream = stream
+        self.offset = offset
+        self.mode = getattr(stream, 'mode', 'rb')
+
+    def seek(self, position, stop=0):
+        return self.stream.seek(self.offset + position) - self.offset
+
+    def tell(self):
+        return self.stream.tell() - self.offset
+
+    def read(self, lenght=None):
+        return self.stream.read(lenght)
+
+    def write(self, byteObj):
+        return self.stream.write(byteObj)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def kind(sector: bytes) -> str:
+    '''file system of boot sector or empty string'''
+
+    if sector[3:11] == b'EXFAT   ':
+        return 'exFAT'
+
+    if sector[0x52:0x57] == b'FAT32':
+        return 'FAT32'
+
+    if sector[0x36:0x39] == b'FAT':
+        return 'FAT'
+
+    return ''
+
+
+def partition(stream) -> int:
+    '''offset of volume: 0 without MBR, first partition otherwise'''
+
+    stream.seek(0)
+    sector = stream.read(512)
+
+    if len(sector) < 512 or kind(sector) or sector[510:512] != b'\x55\xAA':
+        return 0
+
+    return unpack_from('<I', sector, 0x1C6)[0] * 512
+
+
+def volume(stream, mapfree: bool=True) -> tuple:
+    '''boot sector and FAT of FAT32/exFAT volume through view, exFAT bitmap in boot.bitmap'''
+
+    stream = view(stream, partition(stream))
+    stream.seek(0)
+    sector = bytearray(stream.read(512))
+    fs = kind(sector)
+
+    if fs == 'exFAT':
+        boot = boot_exfat(sector)
+        table = FAT(stream, boot.fatoffs, boot.clusters(), 32, exfat=True, mapfree=False)
+    elif fs == 'FAT32':
+        boot = boot_fat32(sector)
+        # хвост тома за последним кластером, описанным в FAT, не используется
+        clusters = min(boot.clusters(), (boot.fat(1) - boot.fat()) // 4 - 2)
+        table = FAT(stream, boot.fat(), clusters, 32, mapfree=mapfree)
+        table.offset2 = boot.fat(1)
+    else:
+        raise FATException('Only FAT32 and exFAT volumes are supported')
+
+    boot.stream = stream
+
+    if fs == 'exFAT' and mapfree:
+        stream.seek(boot.root())
+        root = stream.read(boot.cluster)
+        start = next((unpack_from('<IQ', root, i + 0x14) for i in range(0, len(root), 32) if root[i] == 0x81), None)
+        if start is None:
+            raise exFATException('Allocation Bitmap not found in root directory')
+        boot.bitmap = Bitmap(boot, table, *start)
+
+    return boot, table
+
+
+def gather(boot, runs: List[Tuple[int, int]]) -> bytes:
+    '''clusters of runs [(start, count)] read one after another'''
+
+    data = []
+
+    for start, count in runs:
+        boot.stream.seek(boot.cl2offset(start))
+        data.append(boot.stream.read(count * boot.cluster))
+
+    return b''.join(data)
+
+
+class item(NamedTuple):
+    name: str
+    dir: bool
+    size: int
+    cluster: int
+    contig: bool = False
+    attributes: int = 0
+
+
+def checksum(short: bytes) -> int:
+    '''checksum of 8.3 name stored in its long name slots'''
+
+    s = 0
+
+    for c in short:
+        s = (((s & 1) << 7) + (s >> 1) + c) & 0xFF
+
+    return s
+
+
+def short_name(raw: bytes, case: int) -> str:
+    '''8.3 name with lowercase flags of Windows NT'''
+
+    base = raw[:8].rstrip(b' ')
+    ext = raw[8:11].rstrip(b' ')
+
+    if base[:1] == b'\x05':
+        base = b'\xE5' + base[1:]
+
+    base = base.decode('cp866', 'replace')
+    ext = ext.decode('cp866', 'replace')
+
+    if case & 0x08:
+        base = base.lower()
+    if case & 0x10:
+        ext = ext.lower()
+
+    return base + '.' + ext if ext else base
+
+
+class directory(object):
+    # каталог, декодируемый по одному кластеру при обращении
+    # entries: [ключ, сырые слоты, item] - ключ exFAT это хеш имени из Stream Extension,
+    # набор слотов превращается в item только когда хеш совпал или нужен весь список,
+    # ключ FAT32 - имя в верхнем регистре, там хеша нет и имя декодируется сразу
+    # index: ключ -> номера записей уже прочитанных кластеров
+    # без chain каталог разбирается из уже прочитанных данных через parse_exfat/parse_fat
+
+    def __init__(self, chain: Chain, cluster: int, exfat: bool):
+        self.chain = chain
+        self.cluster = cluster
+        self.exfat = exfat
+        self.entries = []
+        self.index = {}
+        self.next = 0
+        self.done = chain is None or not chain.start
+        self.tail = b''
+        self.lfn = []
+
+    def add(self, key, raw: bytes, found: item=None):
+        self.index.setdefault(key, []).append(len(self.entries))
+        self.entries.append([key, raw, found])
+
+    def load(self) -> bool:
+        '''decode next cluster, False at the end of directory'''
+
+        if self.done or self.next * self.cluster >= self.chain.size:
+            self.done = True
+            return False
+
+        self.chain.seek(self.next * self.cluster)
+        data = bytes(self.chain.read(self.cluster))
+        self.next += 1
+
+        if self.exfat:
+            self.parse_exfat(data)
+        else:
+            self.parse_fat(data)
+
+        return True
+
+    def parse_exfat(self, data: bytes):
+        buf = self.tail + data
+        i = 0
+
+        while i + 32 <= len(buf):
+            if not buf[i]:
+                self.done = True
+                break
+            if buf[i] != 0x85:
+                i += 32
+                continue
+            lenght = (buf[i + 1] + 1) * 32
+            if i + lenght > len(buf):
+                break
+            self.add(unpack_from('<H', buf, i + 36)[0], buf[i:i + lenght])
+            i += lenght
+
+        self.tail = buf[i:]
+
+    def parse_fat(self, data: bytes):
+        for i in range(0, len(data), 32):
+            first = data[i]
+            attributes = data[i + 11]
+            if not first:
+                self.done = True
+                return
+            if first == 0xE5:
+                self.lfn = []
+                continue
+            if attributes == 0x0F:
+                if first & 0x40:
+                    self.lfn = []
+                self.lfn.append((data[i + 13], data[i + 1:i + 11] + data[i + 14:i + 26] + data[i + 28:i + 32]))
+                continue
+            short = data[i:i + 11]
+            lfn, self.lfn = self.lfn, []
+            if attributes & 0x08 or short in (b'.          ', b'..         '):
+                continue
+            name = short_name(short, data[i + 12])
+            if lfn and all(part[0] == checksum(short) for part in lfn):
+                name = b''.join(part[1] for part in reversed(lfn)).decode('utf_16_le', 'replace').split('\0')[0]
+            cluster = unpack_from('<H', data, i + 20)[0] << 16 | unpack_from('<H', data, i + 26)[0]
+            found = item(name, bool(attributes & 0x10), unpack_from('<I', data, i + 28)[0], cluster, False, attributes)
+            self.add(name.upper(), None, found)
+
+    def decode(self, i: int) -> item:
+        entry = self.entries[i]
+
+        if entry[2] is None:
+            e = exFATDirentry(bytearray(entry[1]))
+            entry[2] = item(e.Name(), e.IsDir(), e.u64DataLength, e.dwStartCluster, e.IsContig(), e.wFileAttributes)
+
+        return entry[2]
+
+    def find(self, name: str) -> Optional[item]:
+        '''entry by name, clusters are decoded only until it is found'''
+
+        upper = name.upper()
+        key = exFATDirentry.GetNameHash(name.encode('utf_16_le')) if self.exfat else upper
+        checked = 0
+
+        while True:
+            for i in self.index.get(key, ()):
+                if i >= checked and self.decode(i).name.upper() == upper:
+                    return self.entries[i][2]
+            checked = len(self.entries)
+            if not self.load():
+                return None
+
+    def __iter__(self) -> Iterator[item]:
+        i = 0
+
+        while True:
+            while i < len(self.entries):
+                yield self.decode(i)
+                i += 1
+            if not self.load():
+                return
+
+
+class reader(object):
+    # чтение существующего тома FAT32 или exFAT (образ, контейнер .afi, устройство)
+    # таблица FAT читается по мере надобности, каталоги декодируются лениво по кластеру
+    # и хранятся в LRU на cache каталогов, поиск в exFAT идет по хешу имени
+
+    def __init__(self, stream, cache: int=256):
+        self.boot, self.fat = volume(stream, mapfree=False)
+        self.stream = self.boot.stream
+        self.fs = 'exFAT' if self.fat.exfat else 'FAT32'
+        self.cache = cache
+        self.directories = OrderedDict()
+        self.root = item('', True, 0, self.boot.dwRootCluster, False, 0x10)
+
+    def directory(self, found: item) -> directory:
+        '''decoded directory from LRU or a new lazy one'''
+
+        d = self.directories.get(found.cluster)
+
+        if d is not None:
+            self.directories.move_to_end(found.cluster)
+            return d
+
+        if self.fs == 'exFAT' and found is not self.root:
+            chain = Chain(self.boot, self.fat, found.cluster, found.size, nofat=found.contig)
+        else:
+            chain = Chain(self.boot, self.fat, found.cluster)
+
+        d = directory(chain, self.boot.cluster, self.fs == 'exFAT')
+        self.directories[found.cluster] = d
+
+        if len(self.directories) > self.cache:
+            self.directories.popitem(last=False)
+
+        return d
+
+    def stat(self, path: str) -> item:
+        '''entry of path, / is the root directory'''
+
+        found = self.root
+
+        for name in filter(None, path.replace('\\', '/').split('/')):
+            if not found.dir:
+                raise NotADirectoryError(path)
+            found = self.directory(found).find(name)
+            if found is None:
+                raise FileNotFoundError(path)
+
+        return found
+
+    def exists(self, path: str) -> bool:
+        try:
+            self.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return False
+
+        return True
+
+    def listdir(self, path: str='/') -> List[item]:
+        found = self.stat(path)
+
+        if not found.dir:
+            raise NotADirectoryError(path)
+
+        return list(self.directory(found))
+
+    def walk(self, path: str='/') -> Iterator[Tuple[str, List[item], List[item]]]:
+        '''like os.walk, top-down'''
+
+        items = self.listdir(path)
+        dirs = [found for found in items if found.dir]
+
+        yield path, dirs, [found for found in items if not found.dir]
+
+        for found in dirs:
+            yield from self.walk(path.rstrip('/') + '/' + found.name)
+
+    def open(self, path: str) -> Chain:
+        '''file content as read-only stream'''
+
+        found = self.stat(path)
+
+        if found.dir:
+            raise IsADirectoryError(path)
+
+        return Chain(self.boot, self.fat, found.cluster, found.size, nofat=found.contig and self.fs == 'exFAT')
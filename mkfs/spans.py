@@ -0,0 +1,63 @@
+from bisect import bisect_right
+
+
+class spans(object):
+    # кэш записей FAT, хранящий серии одним интервалом вместо записи на каждый кластер
+    # items: отсортированный список (start, end, first, step, last), запись i равна
+    # first + (i - start) * step, последняя запись интервала равна last
+
+    def __init__(self):
+        self.starts = []
+        self.items = []
+
+    def get(self, index: int) -> int:
+        '''cached value of entry index or None'''
+
+        i = bisect_right(self.starts, index) - 1
+
+        if i < 0:
+            return None
+
+        start, end, first, step, last = self.items[i]
+
+        if index >= end:
+            return None
+
+        if index == end - 1:
+            return last
+
+        return first + (index - start) * step
+
+    def add(self, start: int, end: int, first: int, step: int, last: int):
+        '''remember entries [start, end)'''
+
+        self.cut(start, end)
+
+        i = bisect_right(self.starts, start)
+        self.items.insert(i, (start, end, first, step, last))
+        self.starts.insert(i, start)
+
+    def cut(self, start: int, end: int):
+        '''forget entries [start, end)'''
+
+        i = bisect_right(self.starts, start)
+
+        if i and self.items[i - 1][1] > start:
+            i -= 1
+
+        j = i
+        replace = []
+
+        while j < len(self.items) and self.items[j][0] < end:
+            s, e, first, step, last = self.items[j]
+            if s < start:
+                replace.append((s, start, first, step, first + (start - 1 - s) * step))
+            if e > end:
+                replace.append((end, e, first + (end - s) * step, step, last))
+            j += 1
+
+        if i == j:
+            return
+
+        self.items[i:j] = replace
+        self.starts[i:j] = [item[0] for item in replace]
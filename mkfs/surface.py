@@ -0,0 +1,144 @@
+from queue import Queue
+from threading import Event, Thread
+from typing import Callable, Dict, List
+
+from .fill import pattern
+from .meter import meter
+from .readback import uncached
+
+
+def cached(stream) -> Callable:
+    '''read(position, lenght) through the stream itself'''
+
+    def read(position: int, lenght: int) -> bytes:
+        stream.seek(position)
+        return stream.read(lenght)
+
+    return read
+
+
+def extend(stream, end: int):
+    '''zero-extend image file or io.BytesIO ending before scanned region, so that its unwritten tail
+    reads as zeros; device that really ends earlier is left as is and its tail is found bad'''
+
+    device = stream
+
+    while hasattr(device, 'stream'):
+        device = device.stream
+
+    # конец блочного устройства Windows известен заранее, запись за него ничего не дает
+    if getattr(device, 'type', '') == 'BLOCKDEV' or stream.seek(0, 2) >= end:
+        return
+
+    try:
+        stream.seek(end - 1)
+        stream.write(b'\x00')
+        stream.flush()
+    except OSError:
+        pass
+
+
+def reader(read: Callable, queue: Queue, position: int, end: int, chunk: int, abort: Event):
+    '''read region sequentially ahead of the checker'''
+
+    while position < end and not abort.is_set():
+        lenght = min(chunk, end - position)
+        try:
+            data = read(position, lenght)
+        except Exception:
+            data = None
+        queue.put((position, lenght, data))
+        position += lenght
+
+    queue.put(None)
+
+
+def failed(data: bytes, lenght: int, position: int, expect) -> bool:
+    '''chunk unreadable, short (stream ends inside region) or different from written pattern'''
+
+    if data is None or len(data) != lenght:
+        return True
+
+    return expect is not None and data != expect.chunk(position, lenght)
+
+
+def sectors(read: Callable, position: int, lenght: int, expect, bs: int, stat: meter) -> List[int]:
+    '''retry failed chunk sector by sector, reporting each sector to stat'''
+
+    bad = []
+
+    for sector in range(position, position + lenght, bs):
+        try:
+            data = read(sector, bs)
+        except Exception:
+            data = None
+        if failed(data, bs, sector, expect):
+            bad.append(sector)
+        stat.update(bs)
+
+    return bad
+
+
+def surface(stream, position: int, lenght: int, expect: bytes=None, chunk: int=1 << 22, bs: int=512, depth: int=3,
+            progress: Callable=None, cancel: object=None) -> List[int]:
+    '''scan region, return offsets of bad sectors,
+    after write (expect given) pattern is read back from the medium past OS page cache'''
+
+    extend(stream, position + lenght)
+
+    if expect is not None:
+        expect = pattern(expect)
+        read = uncached(stream)
+    else:
+        read = cached(stream)
+
+    stat = meter(lenght, 'Surface scan', progress, cancel)
+    queue = Queue(maxsize=depth)
+    abort = Event()
+    retry = []
+
+    thread = Thread(target=reader, args=(read, queue, position, position + lenght, chunk, abort), daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item = queue.get()
+            if item is None:
+                break
+            if failed(item[2], item[1], item[0], expect):
+                retry.append(item[:2])
+            stat.update(item[1])
+    finally:
+        abort.set()
+        while thread.is_alive():
+            while not queue.empty():
+                queue.get()
+            thread.join(0.01)
+
+    bad = []
+    # посекторная перепроверка сбойных блоков - отдельная область с прогрессом и отменой
+    stat = meter(sum(lenght for _, lenght in retry), 'Surface retry', progress, cancel)
+
+    for position, lenght in retry:
+        bad += sectors(read, position, lenght, expect, bs, stat)
+
+    return bad
+
+
+def bad_clusters(bad: List[int], dataoffs: int, cluster: int, last: int) -> Dict[int, int]:
+    '''group bad sectors in runs of bad clusters {start: count}'''
+
+    runs = {}
+    prev = -1
+
+    for index in sorted({(sector - dataoffs) // cluster + 2 for sector in bad}):
+        if index > last:
+            break
+        if index == prev + 1:
+            runs[start] += 1
+        else:
+            start = index
+            runs[start] = 1
+        prev = index
+
+    return runs
@@ -0,0 +1,101 @@
+from struct import unpack_from
+from typing import Dict
+
+from .boot import boot_exfat, fat32_fsinfo
+from .clustermap import mask
+from .error import exFATException
+from .exfs import Chain
+from .reader import volume
+
+
+def popcount(data: bytes, bits: int=None) -> int:
+    '''set bits of buffer, or of its first bits, counted at once as one big integer'''
+
+    value = int.from_bytes(data, 'little')
+
+    if bits is not None:
+        value &= (1 << bits) - 1
+
+    if hasattr(value, 'bit_count'):
+        return value.bit_count()
+
+    return bin(value).count('1')
+
+
+def fsinfo(boot) -> fat32_fsinfo:
+    position = boot.wFSISector * boot.wBytesPerSector
+    boot.stream.seek(position)
+
+    return fat32_fsinfo(bytearray(boot.stream.read(512)), position)
+
+
+def trusted(fsi: fat32_fsinfo, clusters: int) -> bool:
+    '''FSInfo signatures are in place and its hints fit the volume'''
+
+    return fsi.sSignature1 == b'RRaA' and fsi.sSignature2 == b'rrAa' and fsi.wBootSignature == 0xAA55 and \
+        fsi.dwFreeClusters <= clusters and \
+        (fsi.dwNextFreeCluster == 0xFFFFFFFF or 2 <= fsi.dwNextFreeCluster <= clusters + 1)
+
+
+def store(boot, free: int, following: int=None):
+    '''hints after allocations: FSInfo free count and next free cluster (FAT32),
+    PercentInUse in main and backup VBR (exFAT)'''
+
+    if isinstance(boot, boot_exfat):
+        clusters = boot.clusters()
+        sector = 1 << boot.uchBytesPerSector
+        # процент занятости не входит в контрольную сумму VBR, основной и резервный пишутся на месте
+        percent = bytes([100 * (clusters - free) // clusters])
+        for position in (0x70, 12 * sector + 0x70):
+            boot.stream.seek(position)
+            boot.stream.write(percent)
+        return
+
+    fsi = fsinfo(boot)
+    fsi.dwFreeClusters = free
+
+    if following is not None:
+        fsi.dwNextFreeCluster = following
+
+    boot.stream.seek(fsi._pos)
+    boot.stream.write(fsi.pack())
+
+
+def usage(stream, trust: bool=True) -> Dict[str, object]:
+    '''free and used space of FAT32/exFAT volume without mapping free runs:
+    FAT32 trusts FSInfo when it is valid, otherwise counts free FAT entries,
+    exFAT counts set bits of Allocation Bitmap'''
+
+    boot, table = volume(stream, mapfree=False)
+    clusters = table.size
+    following = None
+
+    if table.exfat:
+        source = 'bitmap'
+        boot.stream.seek(boot.root())
+        root = boot.stream.read(boot.cluster)
+        found = next((unpack_from('<IQ', root, i + 0x14) for i in range(0, len(root), 32) if root[i] == 0x81), None)
+        if found is None:
+            raise exFATException('Allocation Bitmap not found in root directory')
+        # биты за последним кластером не считаются
+        free = clusters - popcount(Chain(boot, table, *found).read((clusters + 7) // 8), clusters)
+    else:
+        fsi = fsinfo(boot)
+        if trust and trusted(fsi, clusters):
+            source = 'fsinfo'
+            free = fsi.dwFreeClusters
+            following = fsi.dwNextFreeCluster
+        else:
+            source = 'fat'
+            boot.stream.seek(boot.fat())
+            entries = mask(boot.stream.read(4 * (clusters + 2)), True)
+            free = entries.count(0, 2)
+            following = entries.find(0, 2)
+            following = following if following >= 0 else 0xFFFFFFFF
+
+    used = clusters - free
+
+    return {'fs': 'exFAT' if table.exfat else 'FAT32', 'cluster': boot.cluster, 'clusters': clusters,
+            'free': free, 'used': used, 'percent': 100 * used // clusters, 'bytes': clusters * boot.cluster,
+            'free_bytes': free * boot.cluster, 'used_bytes': used * boot.cluster, 'next_free': following,
+            'source': source}
@@ -0,0 +1,4 @@
+from .flash import flash
+from .job import job
+from .station import station
+from .table import table
@@ -0,0 +1,47 @@
+import os
+from argparse import ArgumentParser
+
+import blockdev
+from blockdev.drive import Drive
+from .flash import flash
+from .table import table
+
+
+def targets(paths: list) -> dict:
+    '''image files by path, devices as found by blockdev scan with letters and real size'''
+
+    devices = {}
+
+    if not all(os.path.isfile(path) for path in paths):
+        devices = {usb.path: (name, usb) for name, usb in blockdev.scan().items()}
+
+    out = {}
+
+    for path in paths:
+        if os.path.isfile(path):
+            out[path] = Drive(path, '', [], path, os.path.getsize(path))
+        elif path in devices:
+            out[devices[path][0]] = devices[path][1]
+        else:
+            raise SystemExit(f'{path}: not an image file or removable device')
+
+    return out
+
+
+def main():
+    parser = ArgumentParser(prog='python -m station', description='AlterFAT golden image flasher')
+    parser.add_argument('image', help='golden image, sparse file preferred')
+    parser.add_argument('targets', nargs='+', help='removable devices or image files to write')
+    parser.add_argument('--holes', default='free', choices=('free', 'skip', 'zero'),
+                        help='free: zero holes outside free clusters, skip: targets are blank, zero: zero every hole')
+    args = parser.parse_args()
+
+    results = flash(args.image, targets(args.targets), args.holes)
+
+    print(table(results))
+
+    return 0 if all(result['status'] == 'pass' for result in results) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,175 @@
+import errno, io, os
+from bisect import bisect_right
+from threading import Thread
+from time import perf_counter
+from typing import Callable, Dict, List, Tuple
+
+from blockdev.drive import Drive
+from mkfs import afi, cancel_error, fopen, handle_list
+from mkfs.fill import fill
+from mkfs.meter import meter
+from .ring import ring
+from .volume import free
+
+
+def extents(f, size: int) -> List[Tuple[int, int]]:
+    '''data regions of sparse image or container, whole image where SEEK_DATA is not supported'''
+
+    if hasattr(f, 'extents'):
+        return f.extents()
+
+    if not hasattr(os, 'SEEK_DATA'):
+        return [(0, size)]
+
+    out = []
+    position = 0
+
+    try:
+        fd = f.fileno()
+        while position < size:
+            try:
+                start = os.lseek(fd, position, os.SEEK_DATA)
+            except OSError as e:
+                if e.errno == errno.ENXIO:
+                    break
+                raise
+            position = min(os.lseek(fd, start, os.SEEK_HOLE), size)
+            out.append((start, position))
+    except (OSError, io.UnsupportedOperation):
+        return [(0, size)]
+
+    return out
+
+
+def inside(start: int, end: int, ranges: List[Tuple[int, int]]) -> bool:
+    '''region lies in one of sorted ranges'''
+
+    i = bisect_right(ranges, (start, float('inf'))) - 1
+
+    return i >= 0 and ranges[i][1] >= end
+
+
+def outside(start: int, end: int, ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    '''parts of region not covered by sorted ranges'''
+
+    out = []
+
+    for a, b in ranges:
+        if b <= start or a >= end:
+            continue
+        if a > start:
+            out.append((start, a))
+        start = max(start, b)
+
+    if start < end:
+        out.append((start, end))
+
+    return out
+
+
+def read(image, size: int, buffer: ring, holes: str, chunk: int, cancel: object=None):
+    '''read golden image once, data blocks to writers, zero regions as (position, lenght, None)'''
+
+    data = extents(image, size)
+    unused = []
+
+    if holes == 'free':
+        try:
+            unused = free(image)
+        except Exception:
+            '''unknown or damaged volume, every hole is zeroed'''
+    position = 0
+
+    for start, end in data + [(size, size)]:
+        if holes != 'skip':
+            for a, b in outside(position, start, unused):
+                if not buffer.put((a, b - a, None)):
+                    return
+        for p in range(start, end, chunk):
+            if cancel is not None and cancel.is_set():
+                return
+            image.seek(p)
+            block = image.read(min(chunk, end - p))
+            if block.count(0) == len(block) and (holes == 'skip' or inside(p, p + len(block), unused)):
+                continue
+            if not buffer.put((p, len(block), block)):
+                return
+        position = end
+
+
+def write(usb: Drive, index: int, buffer: ring, size: int, result: dict, progress: Callable=None, cancel: object=None):
+    '''copy blocks from ring to one device, zero regions through mkfs fill()'''
+
+    try:
+        if usb.size < size:
+            raise ValueError(f'Image of {size} bytes does not fit {usb.size} bytes device')
+        with fopen(usb.path, 'r+b', handle_list(usb.letters)) as stream:
+            stat = meter(size, 'Flash', progress, cancel)
+            while True:
+                item = buffer.get(index)
+                if item is None:
+                    break
+                position, lenght, block = item
+                if block is None:
+                    fill(stream, position, lenght, cancel=cancel)
+                else:
+                    stream.seek(position)
+                    stream.write(block)
+                buffer.done(index)
+                result['bytes'] += lenght
+                stat.update(position + lenght - stat.done)
+        result['status'] = 'pass'
+    except cancel_error:
+        result['status'] = 'cancelled'
+    except Exception as e:
+        result['error'] = str(e) or type(e).__name__
+    finally:
+        buffer.drop(index)
+        result['seconds'] = perf_counter() - result['start']
+        result['speed'] = result['bytes'] / result['seconds'] / (1 << 20) if result['seconds'] else 0.0
+
+
+def flash(image: str, targets: Dict[str, Drive], holes: str='free', chunk: int=1 << 22, depth: int=8,
+          progress: Callable=None, cancel: object=None) -> List[dict]:
+    '''write golden image to all targets at once: one reader, writer thread per device
+    holes: free - skip holes only in free clusters of image volume, zero the rest,
+    skip - targets are blank, zero - write zeros to every hole'''
+
+    if holes not in ('free', 'skip', 'zero'):
+        raise ValueError(f'{holes}: holes must be free, skip or zero')
+
+    with (afi(image) if image.endswith('.afi') else open(image, 'rb')) as f:
+        size = f.seek(0, 2)
+        buffer = ring(depth, len(targets))
+        results = []
+        threads = []
+
+        for index, (name, usb) in enumerate(targets.items()):
+            result = {'name': name, 'path': usb.path, 'hub': usb.hub, 'image': image, 'status': 'fail', 'error': '',
+                      'bytes': 0, 'start': perf_counter()}
+            report = None
+            if progress is not None:
+                report = lambda region, done, total, speed, name=name: progress(name, region, done, total, speed)
+            threads.append(Thread(target=write, args=(usb, index, buffer, size, result, report, cancel), daemon=True))
+            results.append(result)
+
+        for thread in threads:
+            thread.start()
+
+        error = ''
+
+        try:
+            read(f, size, buffer, holes, chunk, cancel)
+        except Exception as e:
+            error = f'Image read failed: {e}'
+        finally:
+            buffer.put(None)
+            for thread in threads:
+                thread.join()
+
+    if error:
+        for result in results:
+            if result['status'] == 'pass':
+                result.update({'status': 'fail', 'error': error})
+
+    return results
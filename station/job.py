@@ -0,0 +1,42 @@
+from time import perf_counter
+from typing import Callable
+
+from blockdev.drive import Drive
+from mbr import mbr
+from mkfs import cancel_error, fat, fopen, handle_list
+
+
+def job(usb: Drive, fs: str, volume_label: str='', verify: bool=False, full: bool=False, scan: bool=False,
+        progress: Callable=None, cancel: object=None) -> dict:
+    '''write MBR and format one device with its own handle and locked volumes, never raises'''
+
+    bs = 512
+    regions = {}
+    result = {'path': usb.path, 'hub': usb.hub, 'fs': fs, 'status': 'fail', 'error': '', 'bytes': 0}
+
+    def report(region: str, done: int, total: int, speed: float):
+        regions[region] = done
+        if progress is not None:
+            progress(region, done, total, speed)
+
+    start = perf_counter()
+
+    try:
+        if cancel is not None and cancel.is_set():
+            raise cancel_error()
+        with fopen(usb.path, 'r+b', handle_list(usb.letters)) as stream:
+            stream.seek(0)
+            stream.write(mbr(usb.size, fs))
+            fat(stream, fs, usb.size - bs, bs, volume_label, verify, full, scan=scan, progress=report, cancel=cancel)
+        result['status'] = 'pass'
+    except cancel_error:
+        result['status'] = 'cancelled'
+    except Exception as e:
+        result['error'] = str(e) or type(e).__name__
+
+    result['start'] = start
+    result['seconds'] = perf_counter() - start
+    result['bytes'] = sum(regions.values())
+    result['speed'] = result['bytes'] / result['seconds'] / (1 << 20) if result['seconds'] else 0.0
+
+    return result
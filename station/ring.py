@@ -0,0 +1,51 @@
+from threading import Condition
+
+
+class ring(object):
+    # кольцевой буфер одного читателя и нескольких писателей: блок освобождается, когда
+    # его записали все живые писатели, читатель ждет самого медленного из них
+    # писатель, выбывший по ошибке, больше не задерживает остальных
+
+    def __init__(self, depth: int, writers: int):
+        self.depth = depth
+        self.items = [None] * depth
+        self.head = 0
+        self.tails = [0] * writers
+        self.alive = [True] * writers
+        self.cond = Condition()
+
+    def slowest(self) -> int:
+        return min((tail for tail, alive in zip(self.tails, self.alive) if alive), default=self.head)
+
+    def put(self, item) -> bool:
+        '''add block once there is room, False when no writer is left'''
+
+        with self.cond:
+            while any(self.alive) and self.head - self.slowest() >= self.depth:
+                self.cond.wait()
+            if not any(self.alive):
+                return False
+            self.items[self.head % self.depth] = item
+            self.head += 1
+            self.cond.notify_all()
+            return True
+
+    def get(self, writer: int):
+        '''next block of writer, waits for reader'''
+
+        with self.cond:
+            while self.tails[writer] == self.head:
+                self.cond.wait()
+            return self.items[self.tails[writer] % self.depth]
+
+    def done(self, writer: int):
+        '''writer finished its block, slot may be reused'''
+
+        with self.cond:
+            self.tails[writer] += 1
+            self.cond.notify_all()
+
+    def drop(self, writer: int):
+        with self.cond:
+            self.alive[writer] = False
+            self.cond.notify_all()
@@ -0,0 +1,56 @@
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Semaphore
+from typing import Callable, Dict, List
+
+from blockdev.drive import Drive
+from .job import job
+
+
+class station(object):
+    # станция дубликатора: одновременное форматирование набора устройств, поток на устройство
+    # устройства одного хаба или контроллера делят его полосу, поэтому на хаб приходится
+    # не больше per_hub одновременных заданий, остальные ждут своей очереди
+    # хаб неизвестен (сканер Windows его не заполняет) - устройство считается отдельной группой
+    # progress(name, region, done, total, speed) вызывается из потоков устройств
+
+    def __init__(self, devices: Dict[str, Drive], fs: str, volume_label: str='', per_hub: int=2,
+                 progress: Callable=None, cancel: object=None, **options):
+        self.devices = devices
+        self.fs = fs
+        self.volume_label = volume_label
+        self.per_hub = per_hub
+        self.progress = progress
+        self.cancel = cancel
+        self.options = options
+        self.hubs = defaultdict(lambda: Semaphore(per_hub))
+
+    def report(self, name: str) -> Callable:
+        if self.progress is None:
+            return None
+
+        def progress(region: str, done: int, total: int, speed: float):
+            self.progress(name, region, done, total, speed)
+
+        return progress
+
+    def format(self, name: str, usb: Drive) -> dict:
+        '''one device once its hub has a free slot'''
+
+        with self.hubs[usb.hub or usb.path]:
+            result = job(usb, self.fs, self.volume_label, progress=self.report(name), cancel=self.cancel, **self.options)
+
+        result['name'] = name
+
+        return result
+
+    def run(self) -> List[dict]:
+        '''format all devices, results in order of devices'''
+
+        if not self.devices:
+            return []
+
+        with ThreadPoolExecutor(max_workers=len(self.devices)) as pool:
+            futures = [pool.submit(self.format, name, usb) for name, usb in self.devices.items()]
+
+        return [future.result() for future in futures]
@@ -0,0 +1,20 @@
+from typing import List
+
+
+def table(results: List[dict]) -> str:
+    '''station results as text table with totals'''
+
+    lines = [f"{'status':<9} {'MB':>9} {'sec':>7} {'MB/s':>7}  device"]
+
+    for r in results:
+        lines.append(f"{r['status']:<9} {r['bytes'] / (1 << 20):>9.1f} {r['seconds']:>7.1f} {r['speed']:>7.1f}  {r['name']}")
+        if r['error']:
+            lines.append(f"{'':<9} {r['error']}")
+
+    passed = sum(1 for r in results if r['status'] == 'pass')
+    total = sum(r['bytes'] for r in results) / (1 << 20)
+    seconds = max((r['start'] + r['seconds'] for r in results), default=0.0) - min((r['start'] for r in results), default=0.0)
+
+    lines.append(f"passed {passed}/{len(results)}, {total:.1f} MB in {seconds:.1f} s, {total / seconds if seconds else 0.0:.1f} MB/s")
+
+    return '\n'.join(lines)
@@ -0,0 +1,39 @@
+from struct import unpack_from
+from typing import List, Tuple
+
+from mkfs.boot import boot_exfat, boot_fat16, boot_fat32
+from mkfs.exfs import FAT, Bitmap
+from mkfs.reader import kind, partition, view
+
+
+def free(stream) -> List[Tuple[int, int]]:
+    '''byte ranges of free clusters of FAT/exFAT volume, empty if volume is unknown'''
+
+    offset = partition(stream)
+    stream.seek(offset)
+    sector = bytearray(stream.read(512))
+    fs = kind(sector)
+
+    if not fs:
+        return []
+
+    volume = view(stream, offset)
+
+    if fs == 'exFAT':
+        boot = boot_exfat(sector)
+        boot.stream = volume
+        table = FAT(volume, boot.fatoffs, boot.clusters(), 32, exfat=True)
+        volume.seek(boot.root())
+        root = volume.read(boot.cluster)
+        start = next((unpack_from('<IQ', root, i + 0x14) for i in range(0, len(root), 32) if root[i] == 0x81), None)
+        if start is None:
+            return []
+        allocator = Bitmap(boot, table, start[0], start[1])
+    else:
+        boot = (boot_fat32 if fs == 'FAT32' else boot_fat16)(sector)
+        clusters = boot.clusters()
+        bits = 32 if fs == 'FAT32' else 12 if clusters < 4085 else 16
+        allocator = FAT(volume, boot.fat(), clusters, bits)
+
+    return [(offset + boot.cl2offset(first), offset + boot.cl2offset(first + count))
+            for first, count in sorted(allocator.free_clusters_map.items())]